@@ -1,4 +1,5 @@
 import os
+import time
 from flask import Flask
 from flask_login import LoginManager
 import logging
@@ -13,6 +14,15 @@ login_manager.login_message_category = 'info'  # Set message category
 
 def create_app(config_name='default'):
     """Application factory function"""
+    started = time.perf_counter()
+    timings = {}
+    
+    def mark(phase):
+        nonlocal started
+        now = time.perf_counter()
+        timings[phase] = round(now - started, 3)
+        started = now
+    
     app = Flask(__name__)
     
     # 使用config中的配置，而不是硬编码
@@ -29,7 +39,6 @@ def create_app(config_name='default'):
     os.makedirs(instance_path, exist_ok=True)
     
     # 设置文件上传配置
-    app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32MB max upload size
     app.config['ALLOWED_EXTENSIONS'] = {
         'text': {'txt', 'md', 'rtf'},
         'pdf': {'pdf'},
@@ -38,16 +47,29 @@ def create_app(config_name='default'):
         'video': {'mp4', 'avi', 'mov', 'mkv'}
     }
     
+    # tesseract通过环境变量读取线程数上限，在启动时设置一次，处理线程和子进程都会继承
+    if app.config.get('OCR_THREAD_LIMIT'):
+        os.environ.setdefault('OMP_THREAD_LIMIT', str(app.config['OCR_THREAD_LIMIT']))
+    
     # Create upload folder if it doesn't exist
     app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../uploads')
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
-    # Initialize database
+    mark('config')
+    
+    # Initialize database (import models first so create_all sees every table)
+    from . import models
+    mark('models')
     init_db(app)
+    mark('database')
     
     # Initialize login manager
     login_manager.init_app(app)
     
+    # Initialize background processing queue
+    from .tasks import processing_queue
+    processing_queue.init_app(app)
+    
     # Register blueprints
     from .routes.auth import auth_bp
     from .routes.content import content_bp
@@ -58,6 +80,7 @@ def create_app(config_name='default'):
     app.register_blueprint(content_bp)
     app.register_blueprint(questions_bp)
     app.register_blueprint(feedback_bp)
+    mark('blueprints')
     
     # Configure logging
     logging.basicConfig(
@@ -72,4 +95,9 @@ def create_app(config_name='default'):
     def load_user(id):
         return User.query.get(int(id))
     
+    # 启动耗时明细；输入处理和问题生成模块在第一次使用时才导入，不计入启动时间
+    timings['total'] = round(sum(timings.values()), 3)
+    app.extensions['startup_timings'] = timings
+    logging.info(f"应用启动耗时(秒): {timings}")
+    
     return app 
\ No newline at end of file
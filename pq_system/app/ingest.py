@@ -0,0 +1,319 @@
+import os
+import json
+import uuid
+import socket
+import zipfile
+import logging
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from flask import current_app
+from sqlalchemy import func
+
+from database import db
+from .models.content import Content, ProcessingJob
+from .models.ingest import IngestBatch
+from .storage import store_upload, storage_filename
+from .tasks import processing_queue, find_processed_duplicate, copy_processing_result, run_job, finish_job
+
+
+def _is_hidden(name: str) -> bool:
+    parts = name.replace('\\', '/').split('/')
+    return any(part.startswith('.') or part == '__MACOSX' for part in parts if part)
+
+
+def _iter_directory(path: str) -> Iterator[Tuple[str, int, Callable[[], BinaryIO]]]:
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not _is_hidden(d))
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            relative = os.path.relpath(full_path, path)
+            if _is_hidden(relative):
+                continue
+            yield relative, os.path.getsize(full_path), lambda full_path=full_path: open(full_path, 'rb')
+
+
+def _iter_zip(archive: zipfile.ZipFile) -> Iterator[Tuple[str, int, Callable[[], BinaryIO]]]:
+    for info in archive.infolist():
+        if info.is_dir() or _is_hidden(info.filename):
+            continue
+        yield info.filename, info.file_size, lambda info=info: archive.open(info)
+
+
+@contextmanager
+def open_ingest_source(source: Union[str, BinaryIO]):
+    """
+    打开导入来源，产出(相对路径, 文件大小, 打开函数)的迭代器
+
+    Args:
+        source: 目录路径、ZIP文件路径或可随机读取的ZIP文件对象
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        yield _iter_directory(source)
+        return
+
+    with zipfile.ZipFile(source) as archive:
+        yield _iter_zip(archive)
+
+
+def ingest(source: Union[str, BinaryIO], source_name: Optional[str] = None, creator_id: int = 1,
+           enqueue: bool = True, batch: Optional[IngestBatch] = None) -> Tuple[IngestBatch, List[ProcessingJob]]:
+    """
+    批量导入目录或ZIP压缩包中的所有支持的文件
+
+    每个文件边读取边计算摘要并存入上传目录，所有内容记录和处理任务在同一个事务中创建；
+    已处理过的相同文件直接复用结果。需在应用上下文中调用。
+
+    Args:
+        source: 目录路径、ZIP文件路径或ZIP文件对象
+        source_name: 批次来源名称，默认使用路径的文件名
+        creator_id: 内容创建者ID
+        enqueue: True时交给后台处理队列；False时任务直接标记为由调用方处理（见process_batch_in_pool）
+        batch: 已创建的批次记录（后台解包上传的压缩包时），None表示新建
+
+    Returns:
+        tuple: (批次记录, 需要处理的任务列表)
+    """
+    from .routes.content import get_content_type_from_extension, allowed_file
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    max_file_size = current_app.config['UPLOAD_MAX_FILE_SIZE']
+    if source_name is None and isinstance(source, str):
+        source_name = os.path.basename(os.path.normpath(source))
+
+    if batch is None:
+        batch = IngestBatch(id=uuid.uuid4().hex, source=(source_name or '')[:255])
+    contents = []
+    skipped = []
+
+    with open_ingest_source(source) as entries:
+        for name, size, opener in entries:
+            # 类型和标题按原始文件名判断，安全文件名只用于存储路径
+            filename = os.path.basename(name.replace('\\', '/'))
+            content_type = get_content_type_from_extension(filename)
+            if not content_type or not allowed_file(filename, content_type):
+                skipped.append({'file': name, 'reason': '不支持的文件类型'})
+                continue
+            if size > max_file_size:
+                skipped.append({'file': name, 'reason': '文件大小超出限制'})
+                continue
+
+            with opener() as stream:
+                digest, file_path, _ = store_upload(stream, upload_folder, storage_filename(filename))
+
+            contents.append(Content(
+                title=os.path.splitext(filename)[0][:100] or filename[:100],
+                description=f"批量导入: {source_name}" if source_name else None,
+                creator_id=creator_id,
+                content_type=content_type,
+                original_filename=filename[:100],
+                file_path=file_path,
+                file_digest=digest,
+                batch_id=batch.id,
+                processing_status='pending'
+            ))
+
+    batch.total_files = len(contents)
+    batch.skipped_files = json.dumps(skipped, ensure_ascii=False)
+    batch.status = 'queued'
+    db.session.add(batch)
+    db.session.add_all(contents)
+
+    pending = []
+    waiting = 0
+    seen = set()
+    for content in contents:
+        duplicate = find_processed_duplicate(content.file_digest, content.content_type)
+        if duplicate is not None:
+            copy_processing_result(duplicate, content)
+        elif (content.file_digest, content.content_type) in seen:
+            # 批次内的相同文件只处理一次，其余的在处理完成后复用结果（见settle_batch_duplicates）
+            waiting += 1
+        else:
+            seen.add((content.file_digest, content.content_type))
+            pending.append(content)
+
+    if enqueue:
+        jobs = processing_queue.enqueue_many(pending)
+    else:
+        worker_name = f"{socket.gethostname()}:{os.getpid()}:ingest"
+        now = datetime.utcnow()
+        jobs = []
+        for content in pending:
+            content.processing_status = 'processing'
+            job = ProcessingJob(content=content, status='processing', worker=worker_name,
+                                attempts=1, started_at=now)
+            db.session.add(job)
+            jobs.append(job)
+        db.session.commit()
+
+    logging.info(f"批量导入 {batch.id}: {len(contents)} 个文件，{len(pending)} 个需要处理，"
+                 f"{waiting} 个与批次内其他文件相同，跳过 {len(skipped)} 个")
+    return batch, jobs
+
+
+def claim_next_ingest_batch(worker_name: str) -> Optional[IngestBatch]:
+    """
+    领取下一个等待解包的批次，与claim_next_job一样通过带状态条件的UPDATE原子领取
+
+    Args:
+        worker_name: 工作者标识
+
+    Returns:
+        领取到的批次，没有等待解包的批次时返回None
+    """
+    while True:
+        batch = IngestBatch.query.filter_by(status='pending').order_by(IngestBatch.created_at).first()
+        if batch is None:
+            db.session.rollback()
+            return None
+
+        claimed = IngestBatch.query.filter_by(id=batch.id, status='pending').update({
+            'status': 'unpacking',
+            'started_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+
+        if claimed:
+            db.session.refresh(batch)
+            logging.info(f"{worker_name} 开始解包批次 {batch.id}")
+            return batch
+
+
+def run_ingest_batch(batch: IngestBatch) -> None:
+    """
+    解包已领取的批次的压缩包，存储文件并为其创建处理任务
+
+    Args:
+        batch: 状态为unpacking的批次
+    """
+    try:
+        ingest(batch.archive_path, batch.source, batch=batch)
+    except Exception as e:
+        logging.error(f"解包批次 {batch.id} 失败: {str(e)}", exc_info=True)
+        db.session.rollback()
+        batch.status = 'failed'
+        batch.error = '不是有效的ZIP文件' if isinstance(e, zipfile.BadZipFile) else str(e)
+        db.session.commit()
+
+
+def run_next_ingest_batch(worker_name: str) -> bool:
+    """
+    领取并解包一个等待中的批次（需在应用上下文中调用）
+
+    Returns:
+        是否处理了批次
+    """
+    batch = claim_next_ingest_batch(worker_name)
+    if batch is None:
+        return False
+    run_ingest_batch(batch)
+    return True
+
+
+# 进程池子进程使用的应用（fork时从父进程继承）
+_pool_app = None
+
+
+def _init_pool_worker() -> None:
+    # 文件之间已经并行，处理器内部不再各自启动CPU核数的进程池；不复用父进程的数据库连接
+    os.environ['PDF_EXTRACT_WORKERS'] = '1'
+    with _pool_app.app_context():
+        db.engine.dispose(close=False)
+
+
+def _run_job_in_pool(job_id: int) -> None:
+    with _pool_app.app_context():
+        try:
+            run_job(db.session.get(ProcessingJob, job_id))
+        finally:
+            db.session.remove()
+
+
+def process_batch_in_pool(jobs: List[ProcessingJob], workers: Optional[int] = None,
+                          on_progress: Optional[Callable[[ProcessingJob], None]] = None) -> None:
+    """
+    在进程池中并行处理批量导入的任务
+
+    每个任务在子进程中通过run_job执行，与后台队列的处理方式相同（大型PDF逐页写入数据库），
+    结果由子进程直接写回数据库。不支持fork的平台上在当前进程中逐个处理。
+
+    Args:
+        jobs: ingest(enqueue=False)返回的任务列表
+        workers: 进程数，默认CPU核数
+        on_progress: 每完成一个任务调用一次
+    """
+    global _pool_app
+    if not jobs:
+        return
+
+    job_ids = [job.id for job in jobs]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(job_ids)))
+
+    if not hasattr(os, 'fork'):
+        for job_id in job_ids:
+            job = db.session.get(ProcessingJob, job_id)
+            run_job(job)
+            if on_progress is not None:
+                on_progress(job)
+        return
+
+    # 结束当前事务，避免父进程持有SQLite的读锁阻塞子进程写入
+    db.session.commit()
+    _pool_app = current_app._get_current_object()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=_init_pool_worker) as executor:
+            futures = {executor.submit(_run_job_in_pool, job_id): job_id for job_id in job_ids}
+            for future in as_completed(futures):
+                db.session.expire_all()
+                job = db.session.get(ProcessingJob, futures[future])
+                try:
+                    future.result()
+                except Exception as e:
+                    # 子进程异常退出，任务未能结束
+                    logging.error(f"批量处理任务 {job.id} 出现异常: {str(e)}")
+                    job.content.processing_status = 'failed'
+                    job.content.processing_error = str(e)
+                    finish_job(job)
+
+                if on_progress is not None:
+                    on_progress(job)
+                db.session.commit()
+    finally:
+        _pool_app = None
+
+
+def batch_progress(batch: IngestBatch) -> Dict[str, Any]:
+    """
+    汇总批次的处理进度和失败信息
+
+    Returns:
+        包含各状态计数、是否完成和失败文件列表的字典
+    """
+    counts = {'pending': 0, 'processing': 0, 'completed': 0, 'failed': 0}
+    rows = db.session.query(Content.processing_status, func.count(Content.id)) \
+        .filter(Content.batch_id == batch.id) \
+        .group_by(Content.processing_status).all()
+    for status, count in rows:
+        counts[status or 'pending'] = count
+
+    failures = Content.query.filter_by(batch_id=batch.id, processing_status='failed') \
+        .order_by(Content.id).all()
+
+    # 压缩包尚未解包完成时还没有内容记录
+    unpacked = batch.status not in ('pending', 'unpacking')
+
+    data = batch.to_dict()
+    data.update({
+        'counts': counts,
+        'done': unpacked and counts['pending'] == 0 and counts['processing'] == 0,
+        'failures': [
+            {'content_id': content.id, 'filename': content.original_filename, 'error': content.processing_error}
+            for content in failures
+        ]
+    })
+    return data
@@ -1,5 +1,8 @@
 # Import all models here for easy access
 from .user import User
-from .content import Content
+from .content import Content, ProcessingJob
+from .structure import ContentPage, ContentSlide, ContentSegment
+from .upload import UploadSession
+from .ingest import IngestBatch
 from .question import Question, Option
 from .feedback import Feedback 
\ No newline at end of file
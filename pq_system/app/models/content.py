@@ -1,5 +1,6 @@
 from datetime import datetime
 import os
+import json
 from database import db
 
 class Content(db.Model):
@@ -11,9 +12,12 @@ class Content(db.Model):
     content_type = db.Column(db.String(20), nullable=False)  # 'text', 'ppt', 'pdf', 'audio', 'video'
     original_filename = db.Column(db.String(100))
     file_path = db.Column(db.String(255))
+    file_digest = db.Column(db.String(64), index=True)  # 文件内容的SHA-256摘要，用于去重
     processed_text = db.Column(db.Text)  # 处理后的文本内容
     processing_status = db.Column(db.String(20), default='pending')  # 'pending', 'processing', 'completed', 'failed'
     processing_error = db.Column(db.Text)  # 处理过程中的错误信息
+    processing_metadata = db.Column(db.Text)  # 处理器返回的元数据（JSON），如页数、时长
+    batch_id = db.Column(db.String(32), db.ForeignKey('ingest_batch.id'), index=True)  # 批量导入时所属的批次
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -33,9 +37,51 @@ class Content(db.Model):
             'content_type': self.content_type,
             'original_filename': self.original_filename,
             'processing_status': self.processing_status,
+            'metadata': self.processing_info,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             'creator_id': self.creator_id
         }
+    
+    @property
+    def processing_info(self):
+        """处理器返回的元数据"""
+        return json.loads(self.processing_metadata) if self.processing_metadata else {}
+    
+    @property
+    def latest_job(self):
+        """获取最近一次处理任务"""
+        return self.jobs.order_by(ProcessingJob.id.desc()).first()
+
+class ProcessingJob(db.Model):
+    """处理任务模型：记录内容的后台处理任务，供工作线程领取"""
+    id = db.Column(db.Integer, primary_key=True)
+    content_id = db.Column(db.Integer, db.ForeignKey('content.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='pending', index=True)  # 'pending', 'processing', 'completed', 'failed'
+    attempts = db.Column(db.Integer, default=0)  # 已尝试次数
+    worker = db.Column(db.String(100))  # 领取任务的工作者标识
+    error = db.Column(db.Text)  # 失败时的错误信息
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # 关系
+    content = db.relationship('Content', backref=db.backref('jobs', lazy='dynamic', cascade='all, delete-orphan'))
+    
+    def __repr__(self):
+        return f'<ProcessingJob {self.id}: Content {self.content_id} {self.status}>'
+    
+    def to_dict(self):
+        """转换为字典表示"""
+        return {
+            'id': self.id,
+            'content_id': self.content_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S') if self.started_at else None,
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
 
 class Quiz(db.Model):
     """Quiz model for organizing questions from content"""
@@ -0,0 +1,36 @@
+import json
+from datetime import datetime
+from database import db
+
+class IngestBatch(db.Model):
+    """批量导入批次：一次导入的目录或ZIP压缩包，包含的内容通过Content.batch_id关联"""
+    id = db.Column(db.String(32), primary_key=True)  # 随机生成的批次ID
+    source = db.Column(db.String(255))  # 来源目录或压缩包名称
+    total_files = db.Column(db.Integer, default=0)  # 创建了内容记录的文件数
+    skipped_files = db.Column(db.Text)  # 跳过的文件及原因（JSON列表）
+    status = db.Column(db.String(20), default='queued', index=True)  # 'pending'（等待解包）, 'unpacking', 'queued'（文件已进入处理队列）, 'failed'
+    archive_path = db.Column(db.String(255))  # 由后台解包的压缩包（来自分块上传）
+    upload_id = db.Column(db.String(32), index=True)  # 压缩包所属的分块上传会话ID
+    error = db.Column(db.Text)  # 解包失败时的错误信息
+    started_at = db.Column(db.DateTime)  # 开始解包的时间
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<IngestBatch {self.id}: {self.source}>'
+    
+    @property
+    def skipped(self):
+        """跳过的文件列表"""
+        return json.loads(self.skipped_files) if self.skipped_files else []
+    
+    def to_dict(self):
+        """转换为字典表示"""
+        return {
+            'batch_id': self.id,
+            'source': self.source,
+            'total_files': self.total_files,
+            'skipped': self.skipped,
+            'status': self.status or 'queued',
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
+        }
@@ -0,0 +1,83 @@
+from datetime import datetime
+from database import db
+
+class ContentPage(db.Model):
+    """内容页面模型：按页存储文档的提取文本"""
+    id = db.Column(db.Integer, primary_key=True)
+    content_id = db.Column(db.Integer, db.ForeignKey('content.id'), nullable=False)
+    page_number = db.Column(db.Integer, nullable=False)  # 页码，从1开始
+    text = db.Column(db.Text)
+    char_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 关系
+    content = db.relationship('Content', backref=db.backref('pages', lazy='dynamic', cascade='all, delete-orphan',
+                                                           order_by='ContentPage.page_number'))
+    
+    __table_args__ = (db.UniqueConstraint('content_id', 'page_number'),)
+    
+    def __repr__(self):
+        return f'<ContentPage {self.content_id}-{self.page_number}>'
+    
+    def to_dict(self):
+        """转换为字典表示"""
+        return {
+            'page_number': self.page_number,
+            'text': self.text,
+            'char_count': self.char_count
+        }
+
+class ContentSlide(db.Model):
+    """内容幻灯片模型：按幻灯片存储演示文稿的标题、正文和备注"""
+    id = db.Column(db.Integer, primary_key=True)
+    content_id = db.Column(db.Integer, db.ForeignKey('content.id'), nullable=False)
+    slide_number = db.Column(db.Integer, nullable=False)  # 幻灯片序号，从1开始
+    title = db.Column(db.Text)
+    text = db.Column(db.Text)
+    notes = db.Column(db.Text)  # 演讲者备注
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 关系
+    content = db.relationship('Content', backref=db.backref('slides', lazy='dynamic', cascade='all, delete-orphan',
+                                                           order_by='ContentSlide.slide_number'))
+    
+    __table_args__ = (db.UniqueConstraint('content_id', 'slide_number'),)
+    
+    def __repr__(self):
+        return f'<ContentSlide {self.content_id}-{self.slide_number}>'
+    
+    def to_dict(self):
+        """转换为字典表示"""
+        return {
+            'slide_number': self.slide_number,
+            'title': self.title,
+            'text': self.text,
+            'notes': self.notes
+        }
+
+class ContentSegment(db.Model):
+    """内容片段模型：音视频中带时间戳的文本（语音转写或画面OCR）"""
+    id = db.Column(db.Integer, primary_key=True)
+    content_id = db.Column(db.Integer, db.ForeignKey('content.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'transcript', 'ocr'
+    start_seconds = db.Column(db.Float, nullable=False)
+    end_seconds = db.Column(db.Float)  # 画面OCR只有采样时间，没有结束时间
+    text = db.Column(db.Text)
+    
+    # 关系
+    content = db.relationship('Content', backref=db.backref('segments', lazy='dynamic', cascade='all, delete-orphan',
+                                                           order_by='ContentSegment.start_seconds'))
+    
+    __table_args__ = (db.Index('ix_content_segment_content_kind_start', 'content_id', 'kind', 'start_seconds'),)
+    
+    def __repr__(self):
+        return f'<ContentSegment {self.content_id}-{self.kind}@{self.start_seconds}>'
+    
+    def to_dict(self):
+        """转换为字典表示"""
+        return {
+            'kind': self.kind,
+            'start': self.start_seconds,
+            'end': self.end_seconds,
+            'text': self.text
+        }
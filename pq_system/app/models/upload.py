@@ -0,0 +1,36 @@
+from datetime import datetime
+from database import db
+
+class UploadSession(db.Model):
+    """分块上传会话：记录可续传的大文件上传进度"""
+    id = db.Column(db.String(32), primary_key=True)  # 随机生成的会话ID
+    filename = db.Column(db.String(100), nullable=False)  # 原始文件名（存储路径另行安全处理）
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    content_type = db.Column(db.String(20), nullable=False)  # 'archive'表示用于批量导入的ZIP压缩包
+    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)  # 文件总字节数
+    received = db.Column(db.BigInteger, default=0)  # 已连续写入的字节数（续传位置）
+    status = db.Column(db.String(20), default='uploading', index=True)  # 'uploading', 'completed', 'aborted', 'expired'
+    content_id = db.Column(db.Integer, db.ForeignKey('content.id'))  # 完成后创建的内容记录
+    file_path = db.Column(db.String(255))  # 完成后的文件路径
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 关系
+    content = db.relationship('Content')
+    
+    def __repr__(self):
+        return f'<UploadSession {self.id}: {self.received}/{self.total_size}>'
+    
+    def to_dict(self):
+        """转换为字典表示"""
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'content_type': self.content_type,
+            'size': self.total_size,
+            'offset': self.received,
+            'status': self.status,
+            'content_id': self.content_id
+        }
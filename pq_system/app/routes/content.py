@@ -1,11 +1,21 @@
 import os
+import re
 import uuid
+import zipfile
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for, jsonify, send_file
-from werkzeug.utils import secure_filename
 
 from database import db
-from ..models.content import Content
-from input_processor import process_input
+from ..models.content import Content, ProcessingJob
+from ..models.structure import ContentPage, ContentSlide, ContentSegment
+from ..models.upload import UploadSession
+from ..models.ingest import IngestBatch
+from ..ingest import ingest, batch_progress
+from ..storage import (store_upload, partial_upload_path, upload_lock, write_upload_chunk,
+                       finish_upload, discard_upload_state, storage_filename, local_upload_ids)
+from ..tasks import processing_queue, find_processed_duplicate, copy_processing_result
 
 content_bp = Blueprint('content', __name__, url_prefix='/content')
 
@@ -42,6 +52,65 @@ def get_content_type_from_extension(filename):
     
     return ext_to_type.get(ext)
 
+def _wants_json():
+    """客户端是否期望JSON响应"""
+    best = request.accept_mimetypes.best_match(['application/json', 'text/html'])
+    return best == 'application/json'
+
+def _job_accepted_response(job):
+    """返回任务已受理的JSON响应"""
+    return jsonify({
+        'content_id': job.content_id,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('content.job_status', job_id=job.id)
+    }), 202
+
+def _create_content(title, description, content_type, filename, file_path, digest):
+    """
+    为已存储的文件创建内容记录：相同文件已处理过时复用结果，否则加入处理队列
+    
+    Returns:
+        tuple: (内容记录, 被复用的内容记录或None, 处理任务或None)
+    """
+    # 创建新的内容记录（使用admin ID作为creator_id）
+    creator_id = 1  # 默认使用ID为1的管理员账户
+    
+    content = Content(
+        title=title,
+        description=description,
+        creator_id=creator_id,
+        content_type=content_type,
+        original_filename=filename,
+        file_path=file_path,
+        file_digest=digest,
+        processing_status='pending'
+    )
+    
+    db.session.add(content)
+    
+    # 相同文件已处理过时直接复用提取结果
+    duplicate = find_processed_duplicate(digest, content_type)
+    if duplicate is not None:
+        copy_processing_result(duplicate, content)
+        db.session.commit()
+        return content, duplicate, None
+    
+    db.session.commit()
+    
+    # 加入后台处理队列，立即返回
+    job = processing_queue.enqueue(content)
+    return content, None, job
+
+def _duplicate_response(content, duplicate):
+    """返回复用已有处理结果的JSON响应"""
+    return jsonify({
+        'content_id': content.id,
+        'job_id': None,
+        'status': content.processing_status,
+        'duplicate_of': duplicate.id
+    }), 201
+
 @content_bp.route('/')
 def index():
     """列出用户的内容"""
@@ -84,64 +153,315 @@ def upload():
             flash('所选内容类型不允许上传此类文件', 'danger')
             return redirect(request.url)
         
-        # 使用安全的文件名并添加唯一标识符
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
+        # 存储路径使用安全文件名，边写入边计算摘要，相同内容只存储一份
+        filename = os.path.basename(file.filename.replace('\\', '/'))[:100]
+        digest, file_path, _ = store_upload(
+            file.stream, current_app.config['UPLOAD_FOLDER'], storage_filename(filename)
+        )
+        
+        content, duplicate, job = _create_content(title, description, content_type, filename, file_path, digest)
         
-        # 确保上传目录存在
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if duplicate is not None:
+            if _wants_json():
+                return _duplicate_response(content, duplicate)
+            
+            flash('检测到相同文件，已复用之前的处理结果！', 'success')
+            return redirect(url_for('content.view', id=content.id))
         
-        # 保存文件
-        file.save(file_path)
+        if _wants_json():
+            return _job_accepted_response(job)
         
-        # 创建新的内容记录（使用admin ID作为creator_id）
-        creator_id = 1  # 默认使用ID为1的管理员账户
+        flash('内容已上传，正在后台处理。', 'success')
+        return redirect(url_for('content.view', id=content.id))
+    
+    return render_template('content/upload.html')
+
+_CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+def _upload_session_or_404(upload_id):
+    return UploadSession.query.get_or_404(upload_id)
+
+def _upload_state_response(session, status_code=200, **extra):
+    data = session.to_dict()
+    data['upload_url'] = url_for('content.upload_chunk', upload_id=session.id)
+    data.update(extra)
+    return jsonify(data), status_code
+
+@contextmanager
+def _locked_upload(session):
+    """持有上传会话的锁并刷新会话状态；会话已结束时删除锁文件并释放本进程中的摘要状态"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    with upload_lock(upload_folder, session.id):
+        db.session.refresh(session)
+        yield
+        if session.status != 'uploading':
+            discard_upload_state(upload_folder, session.id)
+
+def expire_stale_uploads():
+    """
+    将超过UPLOAD_SESSION_TTL_HOURS没有新分块的上传会话标记为过期，删除部分文件和锁文件，
+    并释放当前进程中已不再上传的会话的摘要状态
+    
+    Returns:
+        过期的会话数量
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config.get('UPLOAD_SESSION_TTL_HOURS', 24))
+    stale = UploadSession.query.filter(
+        UploadSession.status == 'uploading',
+        UploadSession.updated_at < cutoff
+    ).all()
+    
+    expired = 0
+    for session in stale:
+        with _locked_upload(session):
+            if session.status == 'uploading' and session.updated_at < cutoff:
+                session.status = 'expired'
+                db.session.commit()
+                discard_upload_state(upload_folder, session.id, remove_partial=True)
+                expired += 1
+    
+    # 其他进程结束或过期的会话在本进程中残留的状态
+    local_ids = local_upload_ids()
+    if local_ids:
+        active = {row.id for row in UploadSession.query.filter(
+            UploadSession.id.in_(local_ids), UploadSession.status == 'uploading'
+        ).with_entities(UploadSession.id)}
+        for upload_id in set(local_ids) - active:
+            discard_upload_state(upload_folder, upload_id)
+    db.session.commit()
+    
+    if expired:
+        logging.info(f"已清理 {expired} 个过期的分块上传会话")
+    return expired
+
+def _complete_upload(session):
+    """所有分块已接收：计算摘要、移动到最终位置、创建内容并开始处理"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    digest, file_path = finish_upload(
+        upload_folder, session.id, session.total_size, storage_filename(session.filename)
+    )
+    
+    session.file_path = file_path
+    if session.content_type == 'archive':
+        session.status = 'completed'
+        db.session.commit()
+        return _upload_state_response(session, ingest_url=url_for('content.ingest_batch'))
+    
+    content, duplicate, job = _create_content(
+        session.title, session.description, session.content_type, session.filename, file_path, digest
+    )
+    session.status = 'completed'
+    session.content_id = content.id
+    db.session.commit()
+    
+    if duplicate is not None:
+        return _duplicate_response(content, duplicate)
+    return _job_accepted_response(job)
+
+@content_bp.route('/uploads', methods=['POST'])
+def create_upload():
+    """
+    创建分块上传会话
+    
+    请求参数（JSON或表单）: filename, size, title, description, content_type
+    之后使用PUT /content/uploads/<upload_id>按顺序上传分块，请求头Content-Range: bytes start-end/size
+    ZIP文件上传完成后不创建内容，使用POST /content/ingest（参数upload_id）批量导入其中的文件
+    """
+    data = request.get_json(silent=True) or request.form
+    # 类型和标题按原始文件名判断，安全文件名只在写入磁盘时使用
+    filename = os.path.basename((data.get('filename') or '').replace('\\', '/'))
+    title = data.get('title') or os.path.splitext(filename)[0] or filename
+    if filename.lower().endswith('.zip'):
+        # ZIP压缩包上传完成后通过POST /content/ingest批量导入
+        content_type = 'archive'
+    else:
+        content_type = data.get('content_type') or get_content_type_from_extension(filename)
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': '缺少有效的文件大小size'}), 400
+    
+    if not filename or not content_type or (content_type != 'archive' and not allowed_file(filename, content_type)):
+        return jsonify({'error': '不支持的文件类型'}), 400
+    if size <= 0 or size > current_app.config['UPLOAD_MAX_FILE_SIZE']:
+        return jsonify({'error': '文件大小超出限制'}), 413
+    
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        filename=filename[:100],
+        title=title[:100],
+        description=data.get('description'),
+        content_type=content_type,
+        creator_id=1,  # 默认使用ID为1的管理员账户
+        total_size=size,
+        received=0,
+        status='uploading'
+    )
+    db.session.add(session)
+    db.session.commit()
+    
+    # 创建新会话时顺便清理被放弃的旧会话
+    expire_stale_uploads()
+    
+    chunk_size = min(current_app.config['UPLOAD_CHUNK_SIZE'], current_app.config['MAX_CONTENT_LENGTH'])
+    return _upload_state_response(session, 201, chunk_size=chunk_size)
+
+@content_bp.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """查询上传会话进度，断线后从返回的offset处续传"""
+    return _upload_state_response(_upload_session_or_404(upload_id))
+
+@content_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """
+    上传一个分块：请求体为原始字节，按块写入部分文件并计算摘要，不缓存整个文件
+    
+    起始位置与已接收的字节数不一致时返回409和当前offset；最后一个分块写入后自动完成上传并开始处理。
+    """
+    session = _upload_session_or_404(upload_id)
+    if session.status != 'uploading':
+        return _upload_state_response(session, 409)
+    
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = _CONTENT_RANGE_RE.match(content_range.strip())
+        if not match:
+            return jsonify({'error': 'Content-Range格式应为 bytes start-end/size'}), 400
+        start, end, total = (int(value) for value in match.groups())
+        if total != session.total_size or end < start or end >= total:
+            return jsonify({'error': 'Content-Range与上传会话不一致'}), 400
+        length = end - start + 1
+    else:
+        # 没有Content-Range时视为从当前位置追加
+        start = session.received
+        length = request.content_length
+        if length is None:
+            return jsonify({'error': '缺少Content-Length'}), 411
+        length = min(length, session.total_size - start)
+    
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    with _locked_upload(session):
+        if session.status != 'uploading' or start != session.received:
+            return _upload_state_response(session, 409)
         
-        # 创建新的内容记录
-        content = Content(
-            title=title,
-            description=description,
-            creator_id=creator_id,
-            content_type=content_type,
-            original_filename=filename,
-            file_path=file_path,
-            processing_status='pending'
+        written = write_upload_chunk(
+            partial_upload_path(upload_folder, upload_id), upload_id, start, request.stream, length
         )
         
-        db.session.add(content)
+        # 只有续传位置未被其他进程推进时才更新
+        UploadSession.query.filter_by(id=upload_id, received=start).update(
+            {'received': start + written}, synchronize_session=False
+        )
         db.session.commit()
+        db.session.refresh(session)
         
-        # 开始后台处理
-        try:
-            # 调用内容处理器
-            result = process_input(file_path, content_type)
-            
-            if result.get('success', False):
-                # 更新内容记录
-                content.processed_text = result.get('text', '')
-                content.processing_status = 'completed'
-                db.session.commit()
-                
-                flash('内容已成功上传并处理！', 'success')
-            else:
-                # 处理失败
-                content.processing_status = 'failed'
-                content.processing_error = result.get('error', '未知错误')
-                db.session.commit()
-                
-                flash(f'处理文件时出错: {content.processing_error}', 'warning')
-        except Exception as e:
-            # 捕获处理过程中的异常
-            content.processing_status = 'failed'
-            content.processing_error = str(e)
+        if session.received == session.total_size and session.status == 'uploading':
+            return _complete_upload(session)
+    
+    return _upload_state_response(session)
+
+@content_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """显式完成上传（最后一个分块的响应丢失时可用于重试）"""
+    session = _upload_session_or_404(upload_id)
+    
+    with _locked_upload(session):
+        if session.status == 'completed':
+            if session.content_type == 'archive':
+                return _upload_state_response(session, ingest_url=url_for('content.ingest_batch'))
+            content = session.content
+            job = content.latest_job if content else None
+            if job is not None:
+                return _job_accepted_response(job)
+            return _upload_state_response(session)
+        if session.status != 'uploading' or session.received != session.total_size:
+            return _upload_state_response(session, 409)
+        return _complete_upload(session)
+
+@content_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """放弃上传，删除已接收的部分文件"""
+    session = _upload_session_or_404(upload_id)
+    
+    with _locked_upload(session):
+        if session.status == 'uploading':
+            session.status = 'aborted'
             db.session.commit()
-            
-            flash(f'处理文件时出现异常: {str(e)}', 'danger')
+            discard_upload_state(current_app.config['UPLOAD_FOLDER'], upload_id, remove_partial=True)
+    
+    return _upload_state_response(session)
+
+@content_bp.route('/ingest', methods=['POST'])
+def ingest_batch():
+    """
+    批量导入：上传ZIP压缩包（表单字段file），指定INGEST_ROOT下的目录或ZIP文件（参数path），
+    或导入已完成的分块上传的ZIP压缩包（参数upload_id）
+    
+    所有文件在同一个事务中创建内容记录并进入处理队列，返回202和批次进度地址；
+    分块上传的压缩包由后台工作者解包，批次状态在解包完成前为pending或unpacking。
+    """
+    data = request.get_json(silent=True) or request.form
+    file = request.files.get('file')
+    
+    if data.get('upload_id'):
+        return _ingest_uploaded_archive(data.get('upload_id'))
+    if file and file.filename:
+        source, source_name = file.stream, os.path.basename(file.filename.replace('\\', '/'))
+    elif data.get('path'):
+        ingest_root = current_app.config.get('INGEST_ROOT')
+        if not ingest_root:
+            return jsonify({'error': '未配置INGEST_ROOT，不允许导入服务器目录'}), 403
+        root = os.path.realpath(ingest_root)
+        source = os.path.realpath(os.path.join(root, data.get('path')))
+        if os.path.commonpath([root, source]) != root or not os.path.exists(source):
+            return jsonify({'error': '导入路径不存在'}), 404
+        source_name = os.path.relpath(source, root)
+    else:
+        return jsonify({'error': '需要上传ZIP文件或提供path'}), 400
+    
+    try:
+        batch, _ = ingest(source, source_name)
+    except zipfile.BadZipFile:
+        db.session.rollback()
+        return jsonify({'error': '不是有效的ZIP文件'}), 400
+    
+    data = batch.to_dict()
+    data['progress_url'] = url_for('content.batch_status', batch_id=batch.id)
+    return jsonify(data), 202
+
+def _ingest_uploaded_archive(upload_id):
+    """为已完成上传的压缩包创建等待后台解包的批次；同一个上传会话只创建一个批次"""
+    session = UploadSession.query.get(upload_id)
+    if session is None or session.content_type != 'archive':
+        return jsonify({'error': '压缩包上传会话不存在'}), 404
+    
+    with _locked_upload(session):
+        if session.status != 'completed':
+            return _upload_state_response(session, 409)
         
-        return redirect(url_for('content.view', id=content.id))
+        batch = IngestBatch.query.filter_by(upload_id=session.id).first()
+        if batch is None:
+            batch = IngestBatch(
+                id=uuid.uuid4().hex,
+                source=session.filename,
+                status='pending',
+                archive_path=session.file_path,
+                upload_id=session.id
+            )
+            db.session.add(batch)
+            db.session.commit()
+            processing_queue.notify()
     
-    return render_template('content/upload.html')
+    data = batch.to_dict()
+    data['progress_url'] = url_for('content.batch_status', batch_id=batch.id)
+    return jsonify(data), 202
+
+@content_bp.route('/batches/<batch_id>')
+def batch_status(batch_id):
+    """查询批量导入的整体进度和失败文件"""
+    batch = IngestBatch.query.get_or_404(batch_id)
+    return jsonify(batch_progress(batch))
 
 @content_bp.route('/<int:id>')
 def view(id):
@@ -193,8 +513,9 @@ def delete(id):
     """删除内容"""
     content = Content.query.get_or_404(id)
     
-    # 删除文件（如果存在）
-    if content.file_path and os.path.exists(content.file_path):
+    # 删除文件（如果存在且没有其他内容引用同一文件）
+    shared = Content.query.filter(Content.file_path == content.file_path, Content.id != content.id).count()
+    if content.file_path and not shared and os.path.exists(content.file_path):
         os.remove(content.file_path)
     
     # 从数据库中删除内容
@@ -214,36 +535,102 @@ def reprocess(id):
         flash('原始文件不存在，无法重新处理。', 'danger')
         return redirect(url_for('content.view', id=content.id))
     
-    # 更新状态
-    content.processing_status = 'pending'
-    content.processing_error = None
-    db.session.commit()
+    # 已有排队或处理中的任务时不重复入队
+    job = content.latest_job
+    if job is None or job.status not in ('pending', 'processing'):
+        job = processing_queue.enqueue(content)
     
-    # 重新处理
-    try:
-        result = process_input(content.file_path, content.content_type)
-        
-        if result.get('success', False):
-            content.processed_text = result.get('text', '')
-            content.processing_status = 'completed'
-            db.session.commit()
-            
-            flash('内容已成功重新处理！', 'success')
-        else:
-            content.processing_status = 'failed'
-            content.processing_error = result.get('error', '未知错误')
-            db.session.commit()
-            
-            flash(f'重新处理内容时出错: {content.processing_error}', 'warning')
-    except Exception as e:
-        content.processing_status = 'failed'
-        content.processing_error = str(e)
-        db.session.commit()
-        
-        flash(f'重新处理内容时出现异常: {str(e)}', 'danger')
+    if _wants_json():
+        return _job_accepted_response(job)
     
+    flash('内容已重新加入处理队列。', 'info')
     return redirect(url_for('content.view', id=content.id))
 
+@content_bp.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    """查询处理任务状态（供客户端轮询）"""
+    job = ProcessingJob.query.get_or_404(job_id)
+    
+    data = job.to_dict()
+    data['processing_status'] = job.content.processing_status
+    return jsonify(data)
+
+@content_bp.route('/<int:id>/pages')
+def get_pages(id):
+    """分页获取按页存储的文本（PDF文档）"""
+    content = Content.query.get_or_404(id)
+    
+    start = request.args.get('start', 1, type=int)
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    
+    pages = content.pages.filter(ContentPage.page_number >= start).limit(limit).all()
+    
+    return jsonify({
+        'id': content.id,
+        'page_count': content.pages.count(),
+        'pages': [page.to_dict() for page in pages]
+    })
+
+@content_bp.route('/<int:id>/slides')
+def get_slides(id):
+    """分页获取演示文稿的幻灯片（标题、正文和备注）"""
+    content = Content.query.get_or_404(id)
+    
+    start = request.args.get('start', 1, type=int)
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    
+    slides = content.slides.filter(ContentSlide.slide_number >= start).limit(limit).all()
+    
+    return jsonify({
+        'id': content.id,
+        'slide_count': content.slides.count(),
+        'slides': [slide.to_dict() for slide in slides]
+    })
+
+@content_bp.route('/<int:id>/segments')
+def get_segments(id):
+    """
+    获取音视频带时间戳的文本片段
+    
+    查询参数: kind（transcript或ocr，默认全部）、start和end（秒）、limit
+    """
+    content = Content.query.get_or_404(id)
+    
+    query = content.segments
+    kind = request.args.get('kind')
+    if kind:
+        query = query.filter(ContentSegment.kind == kind)
+    start = request.args.get('start', type=float)
+    if start is not None:
+        query = query.filter(ContentSegment.start_seconds >= start)
+    end = request.args.get('end', type=float)
+    if end is not None:
+        query = query.filter(ContentSegment.start_seconds < end)
+    limit = min(request.args.get('limit', 200, type=int), 1000)
+    
+    return jsonify({
+        'id': content.id,
+        'segments': [segment.to_dict() for segment in query.limit(limit).all()]
+    })
+
+@content_bp.route('/cache/stats')
+def cache_stats():
+    """查看提取结果缓存、语音转写缓存和LLM响应缓存的命中统计（当前进程）"""
+    from input_processor.cache import get_extraction_cache, get_transcript_cache
+    from question_generator.response_cache import get_response_cache
+    
+    def cache_stats_dict(cache):
+        if cache is None:
+            return {'enabled': False}
+        stats = cache.stats()
+        stats['enabled'] = True
+        return stats
+    
+    stats = cache_stats_dict(get_extraction_cache())
+    stats['transcripts'] = cache_stats_dict(get_transcript_cache())
+    stats['llm_responses'] = cache_stats_dict(get_response_cache())
+    return jsonify(stats)
+
 @content_bp.route('/<int:id>/text')
 def get_text(id):
     """获取处理后的文本内容"""
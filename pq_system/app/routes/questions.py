@@ -1,12 +1,12 @@
 import os
-from flask import Blueprint, flash, redirect, render_template, request, url_for, jsonify, abort
+from flask import (Blueprint, Response, flash, redirect, render_template, request, url_for, jsonify, abort,
+                   stream_with_context)
 import json
 
 from database import db
 from ..models.content import Content
 from ..models.question import Question, Option, Discussion
 from ..models.user import User
-from question_generator import generate_questions
 
 questions_bp = Blueprint('questions', __name__, url_prefix='/questions')
 
@@ -19,6 +19,37 @@ def index():
     contents = Content.query.all()
     return render_template('questions/index.html', questions=questions, contents=contents)
 
+def _save_generated_question(content_id, q, difficulty):
+    """保存一个生成的问题及其选项（不提交）"""
+    question = Question(
+        content_id=content_id,
+        text=q.get('question', ''),
+        explanation=q.get('explanation', ''),
+        difficulty=difficulty,
+        quality_score=q.get('quality_score', 0.0),
+        generated_by='ai'
+    )
+    db.session.add(question)
+    db.session.flush()  # 获取生成的ID
+    
+    # 保存选项
+    options = q.get('options', [])
+    correct_idx = q.get('correct_option', 0)
+    
+    for i, option_text in enumerate(options):
+        option = Option(
+            question_id=question.id,
+            text=option_text,
+            is_correct=(i == correct_idx)
+        )
+        db.session.add(option)
+    
+    return question
+
+def _sse(event, data):
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @questions_bp.route('/generate/<int:content_id>', methods=['GET', 'POST'])
 def generate(content_id):
     """基于内容生成问题"""
@@ -44,7 +75,9 @@ def generate(content_id):
             return redirect(url_for('content.view', id=content_id))
         
         try:
-            # 调用问题生成器
+            # 调用问题生成器（首次使用时才导入，加快Web进程启动）
+            from question_generator import generate_questions
+            
             generated_questions = generate_questions(
                 content_text=content.processed_text,
                 num_questions=num_questions,
@@ -56,32 +89,7 @@ def generate(content_id):
                 return redirect(url_for('content.view', id=content_id))
             
             # 保存生成的问题到数据库
-            saved_questions = []
-            for q in generated_questions:
-                question = Question(
-                    content_id=content_id,
-                    text=q.get('question', ''),
-                    explanation=q.get('explanation', ''),
-                    difficulty=difficulty,
-                    quality_score=q.get('quality_score', 0.0),
-                    generated_by='ai'
-                )
-                db.session.add(question)
-                db.session.flush()  # 获取生成的ID
-                
-                # 保存选项
-                options = q.get('options', [])
-                correct_idx = q.get('correct_option', 0)
-                
-                for i, option_text in enumerate(options):
-                    option = Option(
-                        question_id=question.id,
-                        text=option_text,
-                        is_correct=(i == correct_idx)
-                    )
-                    db.session.add(option)
-                
-                saved_questions.append(question)
+            saved_questions = [_save_generated_question(content_id, q, difficulty) for q in generated_questions]
             
             db.session.commit()
             
@@ -95,6 +103,60 @@ def generate(content_id):
     
     return render_template('questions/generate.html', content=content)
 
+@questions_bp.route('/generate/<int:content_id>/stream')
+def generate_stream(content_id):
+    """
+    流式生成问题（text/event-stream）
+    
+    查询参数: num_questions, difficulty。每个问题生成后立即保存并推送question事件，
+    结束时推送done事件（包含保存数量、请求数量、是否完整和问题列表地址），出错时推送error事件。
+    """
+    content = Content.query.get_or_404(content_id)
+    
+    if content.processing_status != 'completed' or not content.processed_text:
+        return jsonify({'error': '内容尚未处理完成，无法生成问题'}), 409
+    
+    num_questions = min(max(1, request.args.get('num_questions', 5, type=int)), 10)
+    difficulty = request.args.get('difficulty', 'medium')
+    text = content.processed_text
+    
+    @stream_with_context
+    def events():
+        # 首次使用时才导入，加快Web进程启动
+        from question_generator import generate_questions_stream
+        
+        saved = 0
+        try:
+            for q in generate_questions_stream(text, num_questions=num_questions, difficulty=difficulty):
+                question = _save_generated_question(content_id, q, difficulty)
+                db.session.commit()
+                saved += 1
+                yield _sse('question', {
+                    'id': question.id,
+                    'index': saved,
+                    'question': question.text,
+                    'options': q.get('options', []),
+                    'correct_option': q.get('correct_option', 0),
+                    'explanation': question.explanation,
+                    'quality_score': question.quality_score
+                })
+        except Exception as e:
+            db.session.rollback()
+            yield _sse('error', {'error': str(e), 'saved': saved})
+            return
+        
+        yield _sse('done', {
+            'saved': saved,
+            'requested': num_questions,
+            'complete': saved >= num_questions,
+            'url': url_for('questions.content_questions', content_id=content_id)
+        })
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 关闭反向代理的缓冲，使每个事件立即送达
+    })
+
 @questions_bp.route('/content/<int:content_id>')
 def content_questions(content_id):
     """查看特定内容的所有问题"""
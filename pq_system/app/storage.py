@@ -0,0 +1,254 @@
+import os
+import uuid
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, List, Tuple
+
+from werkzeug.utils import secure_filename
+
+try:
+    import fcntl
+except ImportError:  # Windows没有flock，只能在进程内互斥
+    fcntl = None
+
+# 每次从上传流中读取的字节数
+CHUNK_SIZE = 1024 * 1024
+
+
+def storage_filename(filename: str) -> str:
+    """
+    磁盘上使用的安全文件名，只用于存储路径
+
+    secure_filename会去掉中文等非ASCII字符（'讲义.pdf'变为'pdf'），这里单独处理扩展名，
+    保证处理器仍能按扩展名判断格式。内容类型、标题和原始文件名应使用未处理的文件名。
+    """
+    basename = os.path.basename(filename.replace('\\', '/'))
+    stem, ext = os.path.splitext(basename)
+    stem = secure_filename(stem) or 'upload'
+    ext = secure_filename(ext)
+    return f"{stem}.{ext}" if ext else stem
+
+
+def content_addressed_path(upload_folder: str, digest: str, filename: str) -> str:
+    """
+    根据内容摘要确定文件的存储路径，相同内容的文件只保存一份
+
+    Args:
+        upload_folder: 上传目录
+        digest: 文件内容的SHA-256摘要
+        filename: 原始文件名（用于保留扩展名，处理器依赖扩展名判断格式）
+
+    Returns:
+        文件的存储路径
+    """
+    _, ext = os.path.splitext(filename)
+    return os.path.join(upload_folder, f"{digest}{ext.lower()}")
+
+
+def store_upload(stream: BinaryIO, upload_folder: str, filename: str) -> Tuple[str, str, int]:
+    """
+    将上传流写入磁盘，同时计算SHA-256摘要，并按摘要去重存储
+
+    文件先写入临时文件，摘要计算完成后再移动到按摘要命名的位置；
+    如果该位置已存在相同内容的文件，则丢弃临时文件直接复用。
+
+    Args:
+        stream: 上传文件的数据流
+        upload_folder: 上传目录
+        filename: 安全处理后的原始文件名
+
+    Returns:
+        tuple: (摘要, 存储路径, 文件大小)
+    """
+    os.makedirs(upload_folder, exist_ok=True)
+    temp_path = os.path.join(upload_folder, f".incoming-{uuid.uuid4()}")
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as temp_file:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                temp_file.write(chunk)
+                size += len(chunk)
+
+        digest = hasher.hexdigest()
+        return (digest, commit_stored_file(temp_path, upload_folder, digest, filename), size)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def commit_stored_file(temp_path: str, upload_folder: str, digest: str, filename: str) -> str:
+    """
+    将已写完并计算出摘要的临时文件移动到按摘要命名的最终位置
+
+    Args:
+        temp_path: 临时文件路径
+        upload_folder: 上传目录
+        digest: 文件内容的SHA-256摘要
+        filename: 原始文件名
+
+    Returns:
+        文件的存储路径
+    """
+    file_path = content_addressed_path(upload_folder, digest, filename)
+    if os.path.exists(file_path):
+        logging.info(f"文件内容已存在，复用已存储的文件: {file_path}")
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, file_path)
+    return file_path
+
+
+# 分块上传：每个会话的增量摘要（已哈希到的偏移量, hashlib对象），只保存在当前进程中
+_upload_hashers = {}
+_upload_locks = {}  # 仅在没有fcntl的平台上使用
+_upload_state_lock = threading.Lock()
+
+
+def partial_upload_path(upload_folder: str, upload_id: str) -> str:
+    """分块上传过程中的部分文件，与最终文件位于同一目录，完成后直接重命名"""
+    return os.path.join(upload_folder, f".partial-{upload_id}")
+
+
+def upload_lock_path(upload_folder: str, upload_id: str) -> str:
+    """上传会话的锁文件（部分文件完成时会被重命名，不能直接对其加锁）"""
+    return os.path.join(upload_folder, f".partial-{upload_id}.lock")
+
+
+@contextmanager
+def upload_lock(upload_folder: str, upload_id: str) -> Iterator[None]:
+    """
+    上传会话的锁，避免并发写入同一个部分文件和增量摘要
+
+    对锁文件加flock，多个Web工作进程（或Web进程与worker.py）之间、同一进程的多个线程之间都互斥。
+    锁文件在会话结束时删除；等待中的请求拿到锁后应重新检查会话状态。
+    """
+    if fcntl is None:
+        with _upload_state_lock:
+            lock = _upload_locks.setdefault(upload_id, threading.Lock())
+        with lock:
+            yield
+        return
+
+    os.makedirs(upload_folder, exist_ok=True)
+    with open(upload_lock_path(upload_folder, upload_id), 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _upload_hasher(path: str, upload_id: str, offset: int):
+    """
+    获取已哈希到offset处的摘要对象
+
+    同一进程内连续上传时直接复用内存中的摘要状态；
+    会话在其他进程中开始或进程重启过时，从磁盘上重新计算已接收部分的摘要。
+    """
+    with _upload_state_lock:
+        state = _upload_hashers.get(upload_id)
+    if state is not None and state[0] == offset:
+        return state[1]
+
+    hasher = hashlib.sha256()
+    if offset:
+        logging.info(f"重新计算上传会话 {upload_id} 已接收的 {offset} 字节的摘要")
+        remaining = offset
+        with open(path, 'rb') as f:
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError(f"上传会话 {upload_id} 的部分文件短于已记录的长度")
+                hasher.update(chunk)
+                remaining -= len(chunk)
+    return hasher
+
+
+def write_upload_chunk(path: str, upload_id: str, offset: int, stream: BinaryIO, length: int) -> int:
+    """
+    将一个分块从请求流写入部分文件的offset处，同时更新增量摘要
+
+    数据按CHUNK_SIZE边读边写，不会在内存中缓存整个分块。连接中断时已写入的部分仍然有效，
+    返回值即为新的续传位置相对offset的增量。
+
+    Args:
+        path: 部分文件路径
+        upload_id: 上传会话ID
+        offset: 分块起始位置（必须等于已接收的字节数）
+        stream: 请求体数据流
+        length: 分块声明的字节数
+
+    Returns:
+        实际写入的字节数
+    """
+    hasher = _upload_hasher(path, upload_id, offset)
+    written = 0
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+        f.seek(offset)
+        try:
+            while written < length:
+                chunk = stream.read(min(CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                f.write(chunk)
+                hasher.update(chunk)
+                written += len(chunk)
+        except Exception as e:
+            logging.warning(f"上传会话 {upload_id} 的分块在 {offset + written} 字节处中断: {str(e)}")
+        # 丢弃此前失败写入残留在续传位置之后的数据
+        f.truncate(offset + written)
+
+    with _upload_state_lock:
+        _upload_hashers[upload_id] = (offset + written, hasher)
+    return written
+
+
+def finish_upload(upload_folder: str, upload_id: str, size: int, filename: str) -> Tuple[str, str]:
+    """
+    完成分块上传：得到整个文件的摘要，并将部分文件重命名到按摘要命名的最终位置
+
+    Returns:
+        tuple: (摘要, 存储路径)
+    """
+    path = partial_upload_path(upload_folder, upload_id)
+    digest = _upload_hasher(path, upload_id, size).hexdigest()
+    file_path = commit_stored_file(path, upload_folder, digest, filename)
+    discard_upload_state(upload_folder, upload_id)
+    return digest, file_path
+
+
+def discard_upload_state(upload_folder: str, upload_id: str, remove_partial: bool = False) -> None:
+    """
+    释放上传会话在当前进程中的摘要状态和锁，并删除锁文件
+
+    Args:
+        upload_folder: 上传目录
+        upload_id: 上传会话ID
+        remove_partial: 是否同时删除已接收的部分文件（放弃或过期的会话）
+    """
+    with _upload_state_lock:
+        _upload_hashers.pop(upload_id, None)
+        _upload_locks.pop(upload_id, None)
+
+    paths = [upload_lock_path(upload_folder, upload_id)]
+    if remove_partial:
+        paths.append(partial_upload_path(upload_folder, upload_id))
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def local_upload_ids() -> List[str]:
+    """当前进程中保存着摘要状态或锁的上传会话ID"""
+    with _upload_state_lock:
+        return list(set(_upload_hashers) | set(_upload_locks))
@@ -0,0 +1,500 @@
+import os
+import json
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from flask import current_app
+from sqlalchemy import insert, literal, select, update
+
+from database import db
+from .models.content import Content, ProcessingJob
+from .models.ingest import IngestBatch
+from .models.structure import ContentPage, ContentSlide, ContentSegment
+
+
+def claim_next_job(worker_name: str) -> Optional[ProcessingJob]:
+    """
+    领取下一个待处理任务
+
+    通过带状态条件的UPDATE实现原子领取，多个线程或进程同时领取时只有一个会成功。
+
+    Args:
+        worker_name: 工作者标识
+
+    Returns:
+        领取到的任务，没有待处理任务时返回None
+    """
+    while True:
+        job = ProcessingJob.query.filter_by(status='pending').order_by(ProcessingJob.id).first()
+        if job is None:
+            db.session.rollback()
+            return None
+
+        claimed = ProcessingJob.query.filter_by(id=job.id, status='pending').update({
+            'status': 'processing',
+            'worker': worker_name,
+            'attempts': (job.attempts or 0) + 1,
+            'started_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+
+        if claimed:
+            db.session.refresh(job)
+            return job
+        # 任务已被其他工作者领取，继续尝试下一个
+
+
+def apply_processing_result(content: Content, result: Dict[str, Any]) -> None:
+    """
+    将处理器返回的结果写入内容记录
+
+    Args:
+        content: 内容记录
+        result: process_input返回的结果字典
+    """
+    if result.get('success', False):
+        # 流式处理时文本已逐页写入数据库，这里不再覆盖
+        if not result.get('streamed', False):
+            content.processed_text = result.get('text', '')
+        save_content_structure(content, result)
+        content.processing_status = 'completed'
+        content.processing_error = None
+    else:
+        content.processing_status = 'failed'
+        content.processing_error = result.get('error') or '未知错误'
+
+
+def save_content_structure(content: Content, result: Dict[str, Any]) -> None:
+    """
+    将处理器返回的元数据和结构（页面、幻灯片、带时间戳的片段）写入内容记录和结构表
+
+    重新处理时替换旧的结构记录；流式处理的PDF页面已逐页写入，这里保留。
+
+    Args:
+        content: 内容记录
+        result: process_input返回的成功结果
+    """
+    content.processing_metadata = json.dumps(result.get('metadata') or {}, ensure_ascii=False, default=str)
+
+    if content.id is None:
+        db.session.flush()
+    content_id = content.id
+
+    if not result.get('streamed', False):
+        ContentPage.query.filter_by(content_id=content_id).delete(synchronize_session=False)
+    ContentSlide.query.filter_by(content_id=content_id).delete(synchronize_session=False)
+    ContentSegment.query.filter_by(content_id=content_id).delete(synchronize_session=False)
+
+    for page in result.get('pages') or []:
+        text = page.get('text') or ''
+        db.session.add(ContentPage(
+            content_id=content_id,
+            page_number=page['page_number'],
+            text=text,
+            char_count=len(text)
+        ))
+
+    for slide in result.get('slides') or []:
+        db.session.add(ContentSlide(
+            content_id=content_id,
+            slide_number=slide['slide_number'],
+            title=slide.get('title'),
+            text=slide.get('content'),
+            notes=slide.get('notes')
+        ))
+
+    # 音频结果的segments和视频结果的transcript_segments都是语音转写（或字幕）片段
+    transcript = result.get('transcript_segments') or result.get('segments') or []
+    for segment in transcript:
+        db.session.add(ContentSegment(
+            content_id=content_id,
+            kind='transcript',
+            start_seconds=segment['start'],
+            end_seconds=segment.get('end'),
+            text=segment.get('text')
+        ))
+
+    for frame in result.get('frames_with_text') or []:
+        db.session.add(ContentSegment(
+            content_id=content_id,
+            kind='ocr',
+            start_seconds=frame['time'],
+            text=frame.get('text')
+        ))
+
+
+def find_processed_duplicate(digest: str, content_type: str) -> Optional[Content]:
+    """
+    查找内容完全相同且已处理完成的内容记录
+
+    Args:
+        digest: 文件内容的SHA-256摘要
+        content_type: 内容类型
+
+    Returns:
+        已处理完成的内容记录，不存在时返回None
+    """
+    if not digest:
+        return None
+    return Content.query.filter_by(
+        file_digest=digest,
+        content_type=content_type,
+        processing_status='completed'
+    ).order_by(Content.id).first()
+
+
+def copy_processing_result(source: Content, target: Content) -> None:
+    """
+    将已有内容的提取结果复用到新内容记录，无需重新处理
+
+    Args:
+        source: 已处理完成的内容记录
+        target: 新建的内容记录
+    """
+    target.processed_text = source.processed_text
+    target.processing_metadata = source.processing_metadata
+    target.processing_status = 'completed'
+    target.processing_error = None
+
+    if target.id is None:
+        db.session.flush()
+
+    # 在数据库中直接复制结构记录，不经过Python对象
+    for model, columns in (
+        (ContentPage, ('page_number', 'text', 'char_count')),
+        (ContentSlide, ('slide_number', 'title', 'text', 'notes')),
+        (ContentSegment, ('kind', 'start_seconds', 'end_seconds', 'text')),
+    ):
+        rows = select(literal(target.id), *(getattr(model, column) for column in columns)) \
+            .where(model.content_id == source.id)
+        db.session.execute(insert(model).from_select(('content_id',) + columns, rows))
+
+
+def should_stream_pdf(file_path: str) -> bool:
+    """页数达到PDF_STREAMING_MIN_PAGES的PDF使用流式处理"""
+    min_pages = int(current_app.config.get('PDF_STREAMING_MIN_PAGES', 0))
+    if min_pages <= 0:
+        return False
+    
+    from input_processor.pdf_processor import get_pdf_page_count
+    try:
+        return get_pdf_page_count(file_path) >= min_pages
+    except Exception as e:
+        logging.warning(f"读取PDF页数失败，使用普通处理: {str(e)}")
+        return False
+
+
+def stream_pdf_into_content(content: Content) -> Dict[str, Any]:
+    """
+    逐页提取PDF并增量写入数据库
+
+    页段在共享进程池中并行提取和OCR，按页码顺序写入：每页保存为一条ContentPage记录，
+    processed_text通过SQL拼接追加，Python进程中最多只保留有限个页段的文本，峰值内存与文档长度无关。
+
+    Args:
+        content: PDF内容记录
+
+    Returns:
+        与process_input格式一致的结果字典（streamed为True，不含text）
+    """
+    from input_processor.pdf_processor import iter_pdf_pages
+
+    batch_pages = int(current_app.config.get('PDF_STREAMING_BATCH_PAGES', 20))
+    content_id = content.id
+    page_count = 0
+    char_count = 0
+
+    ContentPage.query.filter_by(content_id=content_id).delete(synchronize_session=False)
+    db.session.execute(update(Content).where(Content.id == content_id).values(processed_text=''))
+    db.session.commit()
+
+    batch = []
+    extraction_metadata = {}
+
+    def flush():
+        if not batch:
+            return
+        separator = "\n\n" if page_count > len(batch) else ""
+        chunk = separator + "\n\n".join(page.text for page in batch)
+        db.session.add_all(batch)
+        db.session.execute(
+            update(Content)
+            .where(Content.id == content_id)
+            .values(processed_text=Content.processed_text + chunk)
+        )
+        db.session.commit()
+        batch.clear()
+
+    for page_number, text in iter_pdf_pages(content.file_path, metadata=extraction_metadata):
+        batch.append(ContentPage(
+            content_id=content_id,
+            page_number=page_number,
+            text=text,
+            char_count=len(text)
+        ))
+        page_count += 1
+        char_count += len(text)
+        if len(batch) >= batch_pages:
+            flush()
+    flush()
+
+    extraction_metadata.update(page_count=page_count, char_count=char_count)
+    return {
+        "success": True,
+        "streamed": True,
+        "metadata": extraction_metadata,
+        "error": None
+    }
+
+
+def run_job(job: ProcessingJob) -> None:
+    """
+    执行一个已领取的处理任务，并推进内容的processing_status
+
+    Args:
+        job: 状态为processing的任务
+    """
+    from input_processor import process_input
+
+    content = job.content
+    content.processing_status = 'processing'
+    content.processing_error = None
+    db.session.commit()
+
+    try:
+        if content.content_type == 'pdf' and should_stream_pdf(content.file_path):
+            result = stream_pdf_into_content(content)
+        else:
+            result = process_input(content.file_path, content.content_type)
+        apply_processing_result(content, result)
+    except Exception as e:
+        logging.error(f"处理任务 {job.id} 出现异常: {str(e)}", exc_info=True)
+        db.session.rollback()
+        content.processing_status = 'failed'
+        content.processing_error = str(e)
+
+    finish_job(job)
+
+
+def finish_job(job: ProcessingJob) -> None:
+    """根据内容的处理结果结束任务并提交"""
+    job.status = 'completed' if job.content.processing_status == 'completed' else 'failed'
+    job.error = job.content.processing_error
+    job.finished_at = datetime.utcnow()
+    settle_batch_duplicates(job.content)
+    db.session.commit()
+
+
+def settle_batch_duplicates(content: Content) -> None:
+    """
+    处理同一批次中等待该内容结果的相同文件
+
+    批量导入时同一批次内的相同文件只为第一个创建处理任务，其余的保持pending且没有任务；
+    第一个处理完成后复用其结果，失败时一并标记为失败。
+
+    Args:
+        content: 刚处理结束的内容记录
+    """
+    if not content.batch_id or not content.file_digest:
+        return
+
+    waiting = Content.query.filter(
+        Content.batch_id == content.batch_id,
+        Content.file_digest == content.file_digest,
+        Content.content_type == content.content_type,
+        Content.id != content.id,
+        Content.processing_status == 'pending',
+        ~Content.jobs.any()
+    ).all()
+    if not waiting:
+        return
+
+    db.session.flush()
+    for duplicate in waiting:
+        if content.processing_status == 'completed':
+            copy_processing_result(content, duplicate)
+        else:
+            duplicate.processing_status = 'failed'
+            duplicate.processing_error = content.processing_error
+
+
+def run_next_job(worker_name: str) -> bool:
+    """
+    领取并执行一个待处理任务（需在应用上下文中调用）
+
+    Args:
+        worker_name: 工作者标识
+
+    Returns:
+        是否处理了任务
+    """
+    from .ingest import run_next_ingest_batch
+
+    # 先解包等待中的批次，解包后的文件作为普通任务进入队列
+    if run_next_ingest_batch(worker_name):
+        return True
+
+    job = claim_next_job(worker_name)
+    if job is None:
+        return False
+    logging.info(f"{worker_name} 开始处理任务 {job.id} (内容 {job.content_id})")
+    run_job(job)
+    return True
+
+
+def recover_stale_jobs(stale_after: int) -> int:
+    """
+    将长时间停留在processing状态的任务重新放回队列（例如工作进程崩溃后），
+    对应内容的processing_status也恢复为pending；长时间未解包完成的批次同样重新等待解包
+
+    Args:
+        stale_after: 超过多少秒未完成视为失效
+
+    Returns:
+        重新入队的任务数量
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    stale = ProcessingJob.query.filter(
+        ProcessingJob.status == 'processing',
+        ProcessingJob.started_at < cutoff
+    )
+    content_ids = [job.content_id for job in stale.with_entities(ProcessingJob.content_id)]
+    count = stale.update({'status': 'pending', 'worker': None}, synchronize_session=False)
+    if content_ids:
+        # 内容状态同步回到pending，与重新入队的任务一致（同一事务中提交）
+        Content.query.filter(
+            Content.id.in_(content_ids),
+            Content.processing_status == 'processing'
+        ).update({'processing_status': 'pending'}, synchronize_session=False)
+    # 解包在同一个事务中创建内容记录，中断的批次可以从头重新解包
+    IngestBatch.query.filter(
+        IngestBatch.status == 'unpacking',
+        IngestBatch.started_at < cutoff
+    ).update({'status': 'pending'}, synchronize_session=False)
+    db.session.commit()
+    if count:
+        logging.warning(f"已将 {count} 个失效的处理任务重新入队")
+    return count
+
+
+class ProcessingQueue:
+    """持久化处理队列：任务保存在processing_job表中，由后台工作线程池领取执行"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """注册到Flask应用，工作线程在第一次请求或第一次入队时启动"""
+        self.app = app
+        app.extensions['processing_queue'] = self
+
+        @app.before_request
+        def _start_processing_workers():
+            self.start()
+
+    @property
+    def num_workers(self) -> int:
+        return int(self.app.config.get('PROCESSING_WORKERS', 2))
+
+    def start(self) -> None:
+        """启动工作线程（重复调用无副作用）"""
+        if self._threads or self.num_workers <= 0:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            with self.app.app_context():
+                recover_stale_jobs(int(self.app.config.get('PROCESSING_JOB_STALE_SECONDS', 6 * 3600)))
+            for i in range(self.num_workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"pq-processing-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            logging.info(f"已启动 {self.num_workers} 个内容处理工作线程")
+
+    def stop(self) -> None:
+        """通知工作线程退出"""
+        self._stopping.set()
+        self._wakeup.set()
+
+    def notify(self) -> None:
+        """有新的工作（如等待解包的批次）时唤醒工作线程"""
+        self.start()
+        self._wakeup.set()
+
+    def enqueue(self, content: Content) -> ProcessingJob:
+        """
+        为内容创建处理任务并唤醒工作线程
+
+        Args:
+            content: 需要处理的内容记录
+
+        Returns:
+            新建的处理任务
+        """
+        content.processing_status = 'pending'
+        content.processing_error = None
+        job = ProcessingJob(content=content, status='pending')
+        db.session.add(job)
+        db.session.commit()
+
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def enqueue_many(self, contents) -> list:
+        """
+        在同一个事务中为多个内容创建处理任务
+
+        Args:
+            contents: 需要处理的内容记录列表
+
+        Returns:
+            新建的处理任务列表
+        """
+        jobs = []
+        for content in contents:
+            content.processing_status = 'pending'
+            content.processing_error = None
+            job = ProcessingJob(content=content, status='pending')
+            db.session.add(job)
+            jobs.append(job)
+        db.session.commit()
+
+        self.start()
+        self._wakeup.set()
+        return jobs
+
+    def _worker_loop(self) -> None:
+        worker_name = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+        poll_interval = float(self.app.config.get('PROCESSING_POLL_INTERVAL', 5))
+
+        while not self._stopping.is_set():
+            with self.app.app_context():
+                try:
+                    if run_next_job(worker_name):
+                        continue
+                except Exception as e:
+                    logging.error(f"处理队列工作线程出错: {str(e)}", exc_info=True)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+            # 没有任务时等待新任务入队或轮询超时
+            self._wakeup.wait(poll_interval)
+            self._wakeup.clear()
+
+
+processing_queue = ProcessingQueue()
@@ -15,7 +15,11 @@ class Config:
     
     # File upload settings
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-    MAX_CONTENT_LENGTH = 32 * 1024 * 1024  # 32MB max upload size
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_UPLOAD_MB', 32)) * 1024 * 1024  # 单个请求（表单上传或单个分块）的大小上限
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 建议客户端使用的分块大小，不应超过MAX_CONTENT_LENGTH
+    UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_GB', 8)) * 1024 * 1024 * 1024  # 分块上传的文件大小上限
+    UPLOAD_SESSION_TTL_HOURS = int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24))  # 分块上传会话超过该时间没有新分块即过期
+    INGEST_ROOT = os.environ.get('INGEST_ROOT')  # 允许通过API批量导入的服务器目录，未设置时只能上传ZIP
     ALLOWED_EXTENSIONS = {
         'text': {'txt', 'md', 'rtf'},
         'presentation': {'ppt', 'pptx'},
@@ -23,6 +27,26 @@ class Config:
         'audio': {'mp3', 'wav'},
         'video': {'mp4', 'avi', 'mov'}
     }
+    
+    # 快速启动：模型定义未变化时跳过启动时的建表和表结构检查
+    FAST_START = os.environ.get('FAST_START', '1') != '0'
+    
+    # 后台处理队列设置
+    PROCESSING_WORKERS = int(os.environ.get('PROCESSING_WORKERS', 2))  # 工作线程数，0表示不在Web进程中处理
+    PROCESSING_POLL_INTERVAL = 5  # 空闲时轮询新任务的间隔（秒）
+    PROCESSING_JOB_STALE_SECONDS = 6 * 3600  # processing状态超过该时间的任务会被重新入队
+    
+    # 独立工作进程（worker.py）设置
+    WORKER_PROCESSES = int(os.environ.get('WORKER_PROCESSES', 2))  # 预先fork的子进程数
+    WORKER_MAX_JOBS = int(os.environ.get('WORKER_MAX_JOBS', 50))  # 子进程处理多少个任务后重启，0表示不限
+    WORKER_MAX_RSS_MB = int(os.environ.get('WORKER_MAX_RSS_MB', 1024))  # 子进程内存超过该值后重启，0表示不限
+    
+    # 视频帧和扫描页会并发运行多个tesseract，限制每个tesseract进程的线程数，避免相互争抢CPU（0表示不限制）
+    OCR_THREAD_LIMIT = int(os.environ.get('OCR_THREAD_LIMIT', 1))
+    
+    # 大型PDF流式处理设置
+    PDF_STREAMING_MIN_PAGES = int(os.environ.get('PDF_STREAMING_MIN_PAGES', 200))  # 达到该页数时逐页写入数据库，0表示关闭
+    PDF_STREAMING_BATCH_PAGES = 20  # 每次提交的页数
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -33,6 +57,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    PROCESSING_WORKERS = 0
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -1,10 +1,21 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text, select, delete, MetaData, Table, Column, Integer, String
+from sqlalchemy.exc import SQLAlchemyError
 import os
+import hashlib
 import logging
 
 # Initialize SQLAlchemy instance
 db = SQLAlchemy()
 
+# 架构版本标记：记录最近一次建表/升级时模型定义的指纹，单独的MetaData不计入模型
+_marker_metadata = MetaData()
+schema_version_table = Table(
+    'schema_version', _marker_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('version', String(64), nullable=False)
+)
+
 def init_db(app):
     """Initialize the database with the Flask app"""
     db.init_app(app)
@@ -23,7 +34,70 @@ def init_db(app):
     
     # Create all tables if they don't exist
     with app.app_context():
-        db.create_all()
-        logging.info("数据库表已创建")
+        fingerprint = schema_fingerprint()
+        if app.config.get('FAST_START', True) and stored_schema_version() == fingerprint:
+            # 模型定义自上次启动以来没有变化，跳过建表和表结构反射
+            logging.info("数据库架构未变化，跳过建表检查")
+        else:
+            db.create_all()
+            upgrade_schema()
+            store_schema_version(fingerprint)
+            logging.info("数据库表已创建")
         
-    return db 
\ No newline at end of file
+    return db
+
+def schema_fingerprint():
+    """根据模型定义（表、列、类型、索引）计算指纹，模型有任何变化时指纹都会改变"""
+    parts = []
+    for table in db.metadata.sorted_tables:
+        parts.append(f"table:{table.name}")
+        for column in table.columns:
+            parts.append(f"column:{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}")
+        for index in sorted(table.indexes, key=lambda index: index.name or ''):
+            parts.append(f"index:{index.name}:{','.join(column.name for column in index.columns)}")
+    return hashlib.sha256("\n".join(parts).encode('utf-8')).hexdigest()
+
+def stored_schema_version():
+    """读取数据库中记录的架构指纹，没有记录时返回None"""
+    try:
+        with db.engine.connect() as conn:
+            return conn.execute(
+                select(schema_version_table.c.version).where(schema_version_table.c.id == 1)
+            ).scalar()
+    except SQLAlchemyError:
+        return None
+
+def store_schema_version(fingerprint):
+    """记录当前模型定义的架构指纹"""
+    _marker_metadata.create_all(db.engine)
+    with db.engine.begin() as conn:
+        conn.execute(delete(schema_version_table))
+        conn.execute(schema_version_table.insert().values(id=1, version=fingerprint))
+
+def upgrade_schema():
+    """为已存在的表补充模型中新增的列和索引（create_all不会修改已有的表）"""
+    inspector = inspect(db.engine)
+    
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            added_columns = set()
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if column.primary_key or not column.nullable:
+                    logging.warning(f"无法自动添加非空列 {table.name}.{column.name}，请手动迁移")
+                    continue
+                
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                added_columns.add(column.name)
+                logging.info(f"已为表 {table.name} 添加列 {column.name}")
+            
+            # 为新增列创建索引
+            for index in table.indexes:
+                if any(column.name in added_columns for column in index.columns):
+                    index.create(bind=conn, checkfirst=True) 
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+批量导入命令行工具
+
+把目录或ZIP压缩包中所有支持的文件一次性导入为内容，并在进程池中并行处理，显示整体进度。
+
+使用方式:
+    python ingest.py lectures/ --workers 4
+    python ingest.py lectures.zip --enqueue   # 只创建任务，交给worker.py或Web进程处理
+"""
+import os
+import sys
+import logging
+import argparse
+
+# 添加当前目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# 命令行导入时不在本进程中启动后台处理线程（需在加载配置前设置）
+os.environ.setdefault('PROCESSING_WORKERS', '0')
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+from app import create_app
+from app.ingest import ingest, process_batch_in_pool, batch_progress
+from database import db
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PQ System 批量导入')
+    parser.add_argument('source', help='要导入的目录或ZIP压缩包')
+    parser.add_argument('--config', default=os.getenv('FLASK_CONFIG', 'default'), help='配置名称')
+    parser.add_argument('--workers', type=int, default=None, help='并行处理的进程数（默认CPU核数）')
+    parser.add_argument('--enqueue', action='store_true', help='只创建处理任务，由工作进程处理')
+    parser.add_argument('--creator-id', type=int, default=1, help='内容创建者ID')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    if not os.path.exists(args.source):
+        parser.error(f"路径不存在: {args.source}")
+
+    app = create_app(args.config)
+
+    with app.app_context():
+        batch, jobs = ingest(os.path.abspath(args.source), creator_id=args.creator_id,
+                             enqueue=args.enqueue)
+        print(f"批次 {batch.id}: {batch.total_files} 个文件，{len(jobs)} 个需要处理，"
+              f"跳过 {len(batch.skipped)} 个")
+
+        if not args.enqueue and tqdm is not None:
+            with tqdm(total=len(jobs), unit='file') as progress:
+                def on_progress(job):
+                    progress.set_postfix_str(job.content.original_filename or '', refresh=False)
+                    progress.update(1)
+
+                process_batch_in_pool(jobs, args.workers, on_progress)
+        elif not args.enqueue:
+            finished = []
+
+            def on_progress(job):
+                finished.append(job.id)
+                print(f"[{len(finished)}/{len(jobs)}] {job.content.original_filename}: {job.status}")
+
+            process_batch_in_pool(jobs, args.workers, on_progress)
+
+        summary = batch_progress(batch)
+        db.session.remove()
+
+    counts = summary['counts']
+    print(f"完成 {counts['completed']}，失败 {counts['failed']}，"
+          f"等待 {counts['pending'] + counts['processing']}")
+    for item in summary['skipped']:
+        print(f"  跳过 {item['file']}: {item['reason']}")
+    for failure in summary['failures']:
+        print(f"  失败 {failure['filename']} (内容 {failure['content_id']}): {failure['error']}")
+
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,63 @@
+import time
 import logging
+import importlib
 from typing import Dict, Any
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('input_processor.log'),
-        logging.StreamHandler()
-    ]
-)
+def _setup_logging():
+    """第一次处理文件时再配置日志输出，导入本包不产生副作用"""
+    from log_config import setup_file_logging
+    setup_file_logging('input_processor.log')
+
+# 处理器在函数内部按需导入的重量级库，以及处理器模块本身
+PRELOAD_MODULES = [
+    'numpy',
+    'PyPDF2',
+    'pptx',
+    'cv2',
+    'pytesseract',
+    'speech_recognition',
+    'moviepy.editor',
+    '.text_processor',
+    '.pdf_processor',
+    '.ppt_processor',
+    '.audio_processor',
+    '.video_processor',
+]
+
+def preload() -> Dict[str, Any]:
+    """
+    预先导入并初始化处理器依赖的重量级库
+    
+    供长期运行的工作进程在fork子进程之前调用，使每个任务不再承担首次导入的开销。
+    缺少的可选库会被跳过。
+    
+    Returns:
+        每个模块的导入耗时（秒），导入失败的模块对应错误信息
+    """
+    _setup_logging()
+    timings = {}
+    for name in PRELOAD_MODULES:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name, __name__)
+            timings[name] = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            timings[name] = f"unavailable: {str(e)}"
+    
+    # 解析外部程序路径，避免每个任务重复查找
+    try:
+        from .media import get_ffmpeg_exe
+        get_ffmpeg_exe()
+    except Exception as e:
+        logging.warning(f"未找到ffmpeg: {str(e)}")
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except Exception:
+        pass
+    
+    logging.info(f"处理器依赖预加载完成: {timings}")
+    return timings
 
 def process_input(file_path: str, content_type: str = None) -> Dict[str, Any]:
     """
@@ -24,6 +72,8 @@ def process_input(file_path: str, content_type: str = None) -> Dict[str, Any]:
     """
     import os
     
+    _setup_logging()
+    
     result = {
         "success": False,
         "text": "",
@@ -1,116 +1,250 @@
 import os
-import speech_recognition as sr
-from pydub import AudioSegment
-from pydub.silence import split_on_silence
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def process_audio(file_path):
+import numpy as np
+
+from .cache import cached_extraction, get_transcript_cache
+from .media import AUDIO_SAMPLE_RATE, AUDIO_SAMPLE_WIDTH
+from .recognizers import get_recognizer
+from .vad import StreamingSegmenter, iter_speech_segments
+
+# Bump when the transcription output changes so cached results are invalidated
+PROCESSOR_VERSION = '6'
+
+# Segments waiting for a recognizer, per worker; bounds the PCM held in memory
+SEGMENT_QUEUE_PER_WORKER = 2
+
+# Samples quieter than this are trimmed from segment edges before fingerprinting
+FINGERPRINT_SILENCE_AMPLITUDE = 500
+
+def default_asr_workers():
+    """Number of segments transcribed at once (ASR_MAX_WORKERS, default 4)"""
+    workers = int(os.environ.get('ASR_MAX_WORKERS', 0))
+    return workers if workers > 0 else 4
+
+def _recognizer_cache_key(kwargs):
+    return get_recognizer(kwargs.get('recognizer')).cache_key
+
+@cached_extraction('audio', PROCESSOR_VERSION, ignore=('recognizer', 'max_workers'), key_extra=_recognizer_cache_key)
+def process_audio(file_path, recognizer=None, max_workers=None):
     """
     Process an audio file and convert speech to text
     
+    The audio is decoded through an ffmpeg pipe and split into speech
+    segments at silences while it streams; the segments are transcribed
+    concurrently and the transcript is stitched back in order. Memory use
+    is bounded by the segment length, not the length of the recording.
+    
     Args:
         file_path (str): Path to the audio file
+        recognizer: SpeechRecognizer instance or registered backend name;
+            None uses the SPEECH_RECOGNIZER environment variable
+        max_workers (int): Maximum number of concurrent transcriptions
         
     Returns:
-        str: Transcribed text from the audio
+        dict: Result with the transcribed text, timed segments and metadata
     """
+    result = {
+        "success": False,
+        "text": "",
+        "segments": [],
+        "metadata": {},
+        "error": None
+    }
+    
     try:
-        # Initialize the recognizer
-        recognizer = sr.Recognizer()
+        if not os.path.exists(file_path):
+            result["error"] = f"File not found: {file_path}"
+            return result
+        
+        segmenter = StreamingSegmenter()
+        text, segments, metadata = _transcribe(
+            iter_speech_segments(file_path, segmenter), segmenter, recognizer, max_workers
+        )
+        
+        result["success"] = True
+        result["text"] = text
+        result["segments"] = segments
+        result["metadata"] = {
+            "filename": os.path.basename(file_path),
+            "size_bytes": os.path.getsize(file_path),
+            **metadata
+        }
+    except Exception as e:
+        result["error"] = f"Error processing audio file: {str(e)}"
+        logging.error(result["error"], exc_info=True)
+    
+    return result
+
+def transcribe_pcm_stream(stream, recognizer=None, max_workers=None):
+    """
+    Transcribe 16 kHz mono s16le PCM read from a binary stream
+    
+    Used when the audio is already being decoded elsewhere, e.g. the audio
+    pipe of the single-pass video decoder.
+    
+    Args:
+        stream: Readable binary stream, such as a pipe
+        recognizer: SpeechRecognizer instance or registered backend name
+        max_workers (int): Maximum number of concurrent transcriptions
         
-        # Convert audio file to WAV if it's not already
-        file_ext = os.path.splitext(file_path)[1].lower()
-        temp_wav_path = None
+    Returns:
+        dict: Result with the transcribed text, timed segments and metadata
+    """
+    result = {
+        "success": False,
+        "text": "",
+        "segments": [],
+        "metadata": {},
+        "error": None
+    }
+    
+    try:
+        segmenter = StreamingSegmenter()
+        result["text"], result["segments"], result["metadata"] = _transcribe(
+            segmenter.segments(stream), segmenter, recognizer, max_workers
+        )
+        result["success"] = True
+    except Exception as e:
+        result["error"] = f"Error transcribing audio stream: {str(e)}"
+        logging.error(result["error"], exc_info=True)
+    
+    return result
+
+def _transcribe(segment_source, segmenter, recognizer, max_workers):
+    """Transcribe streamed segments and build (text, timed segments, metadata)"""
+    backend = get_recognizer(recognizer)
+    transcripts, errors, cache_hits = transcribe_segments(
+        segment_source,
+        backend,
+        AUDIO_SAMPLE_RATE,
+        AUDIO_SAMPLE_WIDTH,
+        max_workers
+    )
+    if transcripts and len(errors) == len(transcripts):
+        raise Exception(errors[0])
+    
+    segments = [
+        {"start": start / 1000.0, "end": end / 1000.0, "text": text}
+        for start, end, text in transcripts if text
+    ]
+    text = " ".join(segment["text"] for segment in segments)
+    
+    metadata = {
+        "duration_seconds": segmenter.position_ms / 1000.0,
+        "segment_count": len(transcripts),
+        "failed_segments": len(errors),
+        "cached_segments": cache_hits,
+        "recognizer": backend.cache_key,
+        "word_count": len(text.split()),
+        "char_count": len(text)
+    }
+    if errors:
+        # Degraded result: usable, but not cached, so a retry can recover the missing segments
+        logging.warning(f"{len(errors)} of {len(transcripts)} speech segments failed: {errors[0]}")
+        metadata["partial"] = True
+        metadata["segment_error"] = errors[0]
+    return text, segments, metadata
+
+def segment_fingerprint(pcm, sample_width=AUDIO_SAMPLE_WIDTH):
+    """
+    Fingerprint a speech segment from its PCM content
+    
+    Near-silent samples at both ends are ignored, so the same utterance
+    produces the same fingerprint when it is cut with more or less padding,
+    e.g. after trimming an intro or extracting the track from a video.
+    
+    Args:
+        pcm (bytes): 16-bit mono PCM samples
+        sample_width (int): Bytes per sample
         
-        if file_ext != '.wav':
-            # Convert to WAV using pydub
-            temp_wav_path = file_path + ".wav"
-            audio = AudioSegment.from_file(file_path)
-            audio.export(temp_wav_path, format="wav")
-            audio_path = temp_wav_path
-        else:
-            audio_path = file_path
+    Returns:
+        str: SHA-256 hex digest
+    """
+    samples = np.frombuffer(pcm, dtype='<i2', count=len(pcm) // sample_width)
+    loud = np.flatnonzero(np.abs(samples.astype(np.int32)) > FINGERPRINT_SILENCE_AMPLITUDE)
+    if len(loud):
+        samples = samples[loud[0]:loud[-1] + 1]
+    # A segment with no sample above the threshold (quiet speech the VAD still
+    # keeps) is hashed in full; trimming it would give every such segment the
+    # digest of the empty string and one shared cache entry
+    return hashlib.sha256(samples.tobytes()).hexdigest()
+
+def transcribe_segments(segments, recognizer, sample_rate, sample_width, max_workers=None):
+    """
+    Transcribe speech segments concurrently with bounded parallelism
+    
+    Segments are pulled from the iterable only as workers free up, so a
+    streaming source is never read far ahead of the recognizer. Transcripts
+    are cached by segment fingerprint and recognizer, and only segments that
+    have never been seen are sent to the recognizer.
+    
+    Args:
+        segments (iterable): (start_ms, end_ms, pcm) tuples in time order
+        recognizer (SpeechRecognizer): Backend used for every segment
+        sample_rate (int): Samples per second
+        sample_width (int): Bytes per sample
+        max_workers (int): Maximum number of concurrent transcriptions
         
-        # Load the audio file
-        with sr.AudioFile(audio_path) as source:
-            # Adjust for ambient noise
-            recognizer.adjust_for_ambient_noise(source)
-            
-            # For longer files, we'll chunk the audio to process it better
-            audio_data = recognizer.record(source)
+    Returns:
+        tuple: ((start_ms, end_ms, text) list in segment order,
+            list of error messages, number of segments served from the cache)
+    """
+    errors = []
+    transcripts = []
+    cache = get_transcript_cache()
+    cache_hits = []
+    
+    def transcribe(pcm):
+        key = None
+        if cache is not None:
+            raw = f"{recognizer.cache_key}:{sample_rate}:{segment_fingerprint(pcm, sample_width)}"
+            key = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+            cached = cache.get(key)
+            if cached is not None:
+                cache_hits.append(key)
+                return cached
         
-        # Use Google's speech recognition
-        text = recognizer.recognize_google(audio_data)
+        try:
+            text = recognizer.transcribe(pcm, sample_rate, sample_width)
+        except Exception as e:
+            # Skip segments that can't be recognized
+            logging.warning(f"Failed to transcribe audio segment: {str(e)}")
+            errors.append(str(e))
+            return ""
         
-        # Clean up temporary file if created
-        if temp_wav_path and os.path.exists(temp_wav_path):
-            os.remove(temp_wav_path)
-            
+        if key is not None:
+            cache.set(key, text)
         return text
-    except Exception as e:
-        # Clean up temporary file if an error occurred
-        if temp_wav_path and os.path.exists(temp_wav_path):
-            os.remove(temp_wav_path)
-            
-        raise Exception(f"Error processing audio file: {str(e)}")
+    
+    workers = max(1, max_workers or default_asr_workers())
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pq-asr") as executor:
+        for start, end, pcm in segments:
+            pending.append((start, end, executor.submit(transcribe, pcm)))
+            while len(pending) >= workers * SEGMENT_QUEUE_PER_WORKER:
+                start, end, future = pending.popleft()
+                transcripts.append((start, end, future.result()))
+        while pending:
+            start, end, future = pending.popleft()
+            transcripts.append((start, end, future.result()))
+    
+    return transcripts, errors, len(cache_hits)
 
 def large_audio_processing(file_path):
     """
     Process a large audio file by splitting it into chunks
     
+    Kept for backward compatibility; chunks are now streamed and
+    transcribed by process_audio().
+    
     Args:
         file_path (str): Path to the audio file
         
     Returns:
         str: Transcribed text from the audio
     """
-    # Initialize recognizer
-    recognizer = sr.Recognizer()
-    
-    # Convert to WAV if needed
-    file_ext = os.path.splitext(file_path)[1].lower()
-    temp_wav_path = None
-    
-    if file_ext != '.wav':
-        # Convert to WAV using pydub
-        temp_wav_path = file_path + ".wav"
-        audio = AudioSegment.from_file(file_path)
-        audio.export(temp_wav_path, format="wav")
-        audio_path = temp_wav_path
-    else:
-        audio_path = file_path
-        audio = AudioSegment.from_wav(audio_path)
-    
-    # Split audio into chunks based on silence
-    chunks = split_on_silence(
-        audio,
-        min_silence_len=500,  # minimum length of silence in ms
-        silence_thresh=audio.dBFS-14,  # silence threshold
-        keep_silence=500  # keep 500ms of silence at the beginning and end
-    )
-    
-    # Process each chunk
-    transcript = ""
-    for i, chunk in enumerate(chunks):
-        # Export chunk to a temporary file
-        chunk_path = f"temp_chunk_{i}.wav"
-        chunk.export(chunk_path, format="wav")
-        
-        try:
-            # Process the chunk
-            with sr.AudioFile(chunk_path) as source:
-                audio_data = recognizer.record(source)
-                text = recognizer.recognize_google(audio_data)
-                transcript += text + " "
-        except Exception as e:
-            # Skip chunks that can't be recognized
-            pass
-        finally:
-            # Remove temporary chunk file
-            if os.path.exists(chunk_path):
-                os.remove(chunk_path)
-    
-    # Clean up temporary WAV file if created
-    if temp_wav_path and os.path.exists(temp_wav_path):
-        os.remove(temp_wav_path)
-        
-    return transcript 
\ No newline at end of file
+    return process_audio(file_path).get("text", "")
@@ -0,0 +1,252 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+import functools
+from typing import Dict, Any, Optional, Callable, Iterable
+
+# 默认缓存目录，与Web应用的instance目录放在一起
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'extraction_cache'
+)
+
+DEFAULT_TRANSCRIPT_CACHE_DIR = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), 'transcript_cache')
+
+# 计算文件摘要时每次读取的字节数
+_DIGEST_CHUNK_SIZE = 1024 * 1024
+
+
+class DiskCache:
+    """
+    基于目录的键值缓存
+
+    每个条目保存为一个JSON文件，命中时更新文件修改时间；
+    总大小超过上限时按修改时间淘汰最久未使用的条目（LRU）。
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size_bytes = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存条目，不存在时返回None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path, None)  # 记录最近访问时间，供LRU淘汰使用
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """写入缓存条目（先写临时文件再原子替换），并在超出容量时淘汰旧条目"""
+        path = self._path(key)
+        temp_path = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False, default=str)
+            size = os.path.getsize(temp_path)
+            if size > self.max_bytes:
+                os.remove(temp_path)
+                return
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"写入缓存失败: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            if self._size_bytes is not None:
+                self._size_bytes += size
+            if self._size_bytes is None or self._size_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> Iterable[os.DirEntry]:
+        with os.scandir(self.directory) as it:
+            return [entry for entry in it if entry.name.endswith('.json') and entry.is_file()]
+
+    def _evict(self) -> None:
+        """按最近访问时间从旧到新删除条目，直到总大小不超过上限"""
+        entries = []
+        total = 0
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+        self._size_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中统计"""
+        with self._lock:
+            if self._size_bytes is None:
+                self._evict()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "directory": self.directory
+            }
+
+
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(file_path: str) -> str:
+    """
+    计算文件内容的SHA-256摘要
+
+    按(路径, 大小, 修改时间)记忆结果，同一文件在同一进程内只读取一次。
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest:
+        return digest
+
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_DIGEST_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+
+    with _digest_lock:
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _get_named_cache(env_prefix: str, default_dir: str, default_max_mb: int) -> Optional[DiskCache]:
+    """按环境变量前缀创建并复用进程内共享的磁盘缓存"""
+    if os.environ.get(f'{env_prefix}_ENABLED', '1') == '0':
+        return None
+
+    with _caches_lock:
+        cache = _caches.get(env_prefix)
+        if cache is None:
+            directory = os.environ.get(f'{env_prefix}_DIR', default_dir)
+            max_bytes = int(os.environ.get(f'{env_prefix}_MAX_MB', default_max_mb)) * 1024 * 1024
+            cache = _caches[env_prefix] = DiskCache(directory, max_bytes)
+        return cache
+
+
+def get_extraction_cache() -> Optional[DiskCache]:
+    """
+    获取进程内共享的提取结果缓存
+
+    通过环境变量配置：
+        EXTRACTION_CACHE_ENABLED: 设为0关闭缓存
+        EXTRACTION_CACHE_DIR: 缓存目录
+        EXTRACTION_CACHE_MAX_MB: 缓存容量上限（MB）
+    """
+    return _get_named_cache('EXTRACTION_CACHE', DEFAULT_CACHE_DIR, 512)
+
+
+def get_transcript_cache() -> Optional[DiskCache]:
+    """
+    获取语音片段转写结果缓存（按片段PCM指纹存储，跨文件复用）
+
+    通过环境变量配置：
+        TRANSCRIPT_CACHE_ENABLED: 设为0关闭缓存
+        TRANSCRIPT_CACHE_DIR: 缓存目录
+        TRANSCRIPT_CACHE_MAX_MB: 缓存容量上限（MB）
+    """
+    return _get_named_cache('TRANSCRIPT_CACHE', DEFAULT_TRANSCRIPT_CACHE_DIR, 64)
+
+
+def extraction_cache_key(digest: str, content_type: str, version: str, options: Dict[str, Any] = None) -> str:
+    """由文件摘要、内容类型、处理器版本和影响输出的参数生成缓存键"""
+    raw = json.dumps([digest, content_type, version, options or {}], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def cached_extraction(content_type: str, version: str, ignore: Iterable[str] = (),
+                      key_extra: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Callable:
+    """
+    为处理函数添加提取结果缓存
+
+    被装饰的函数第一个参数必须是文件路径。只缓存成功且完整的结果
+    （metadata中partial为True的降级结果不缓存，重新处理时可以恢复）；
+    修改处理逻辑时应提高对应模块的PROCESSOR_VERSION，使旧缓存失效。
+
+    Args:
+        content_type: 内容类型
+        version: 处理器版本
+        ignore: 不计入缓存键的参数名（如并行度，或由key_extra处理的参数）
+        key_extra: 可选，根据调用参数返回额外的缓存键内容（如所用识别引擎的名称）
+    """
+    ignore = set(ignore)
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(file_path: str, *args, **kwargs):
+            cache = get_extraction_cache()
+            if cache is None or not os.path.isfile(file_path):
+                return func(file_path, *args, **kwargs)
+
+            options = {name: value for name, value in kwargs.items() if name not in ignore}
+            if args:
+                options['args'] = list(args)
+            if key_extra is not None:
+                options['extra'] = key_extra(kwargs)
+            key = extraction_cache_key(file_digest(file_path), content_type, version, options)
+
+            cached = cache.get(key)
+            if cached is not None:
+                logging.info(f"提取结果缓存命中: {os.path.basename(file_path)} ({content_type})")
+                if isinstance(cached, dict):
+                    cached.setdefault("metadata", {})["extraction_cache"] = "hit"
+                return cached
+
+            result = func(file_path, *args, **kwargs)
+
+            if isinstance(result, dict):
+                if result.get("success", False) and not (result.get("metadata") or {}).get("partial"):
+                    cache.set(key, result)
+                    result.setdefault("metadata", {})["extraction_cache"] = "miss"
+            elif isinstance(result, str):
+                cache.set(key, result)
+
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,309 @@
+import os
+import re
+import shutil
+import logging
+import subprocess
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+# 语音识别使用的音频格式：16kHz单声道
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_CHANNELS = 1
+AUDIO_SAMPLE_WIDTH = 2  # s16le
+
+
+class DemuxError(RuntimeError):
+    """ffmpeg无法读取或解码媒体文件（包括找不到ffmpeg）"""
+
+
+def get_ffmpeg_exe() -> str:
+    """获取ffmpeg可执行文件路径，优先使用moviepy自带的imageio-ffmpeg"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return shutil.which('ffmpeg') or 'ffmpeg'
+
+
+def _audio_output_args(output: str) -> list:
+    """将第一条音轨输出为16kHz单声道s16le原始PCM的ffmpeg输出参数"""
+    return [
+        '-map', '0:a:0', '-vn',
+        '-ac', str(AUDIO_CHANNELS), '-ar', str(AUDIO_SAMPLE_RATE),
+        '-f', 's16le', '-acodec', 'pcm_s16le', output
+    ]
+
+
+def audio_decode_command(file_path: str, output: str = 'pipe:1') -> list:
+    """构造将音轨解码为16kHz单声道s16le原始PCM的ffmpeg命令"""
+    return [get_ffmpeg_exe(), '-v', 'error', '-nostdin', '-i', file_path] + _audio_output_args(output)
+
+
+# 可直接转换为文本的字幕编码（位图字幕如dvd_subtitle、hdmv_pgs_subtitle需要OCR，不在此列）
+TEXT_SUBTITLE_CODECS = {'subrip', 'srt', 'ass', 'ssa', 'mov_text', 'webvtt', 'text'}
+
+_SRT_TIME_RE = re.compile(r"(\d+):(\d+):(\d+)[,.](\d+)\s*-->\s*(\d+):(\d+):(\d+)[,.](\d+)")
+_SUBTITLE_TAG_RE = re.compile(r"<[^>]+>|\{[^}]*\}")
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_STREAM_RE = re.compile(r"Stream #\d+:(\d+)(?:\[\w+\])?(?:\((\w+)\))?:\s*(Video|Audio|Subtitle|Data|Attachment):\s*([^\s,]+)(.*)")
+_SIZE_RE = re.compile(r"\b(\d{2,5})x(\d{2,5})\b")
+_FPS_RE = re.compile(r"([\d.]+)\s*fps")
+_ROTATE_RE = re.compile(r"rotate\s*:\s*(-?\d+)|rotation of\s*(-?[\d.]+)\s*degrees")
+
+
+def probe_media(file_path: str) -> Dict[str, Any]:
+    """
+    读取媒体文件的容器头信息（不解码音视频数据）
+
+    Args:
+        file_path: 媒体文件路径
+
+    Returns:
+        包含时长、视频参数和各个流信息的字典
+    """
+    try:
+        proc = subprocess.run(
+            [get_ffmpeg_exe(), '-hide_banner', '-i', file_path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+    except OSError as e:
+        raise DemuxError(f"无法运行ffmpeg: {str(e)}") from e
+    info = proc.stderr.decode('utf-8', errors='replace')
+
+    result = {
+        "duration_seconds": None,
+        "streams": []
+    }
+
+    match = _DURATION_RE.search(info)
+    if match:
+        hours, minutes, seconds = match.groups()
+        result["duration_seconds"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    rotation = 0
+    for line in info.splitlines():
+        stream_match = _STREAM_RE.search(line)
+        if stream_match:
+            index, language, kind, codec, rest = stream_match.groups()
+            stream = {
+                "index": int(index),
+                "type": kind.lower(),
+                "codec": codec,
+                "language": language
+            }
+            if kind == 'Video' and "width" not in result:
+                size = _SIZE_RE.search(rest)
+                fps = _FPS_RE.search(rest)
+                if size:
+                    result["width"], result["height"] = int(size.group(1)), int(size.group(2))
+                if fps:
+                    result["fps"] = float(fps.group(1))
+            result["streams"].append(stream)
+            continue
+
+        rotate_match = _ROTATE_RE.search(line)
+        if rotate_match:
+            rotation = int(float(rotate_match.group(1) or rotate_match.group(2)))
+
+    result["rotation"] = rotation % 360
+    result["has_video"] = any(s["type"] == 'video' for s in result["streams"])
+    result["has_audio"] = any(s["type"] == 'audio' for s in result["streams"])
+    return result
+
+
+class VideoDemuxer:
+    """
+    单次解码视频：一个ffmpeg进程同时输出按间隔采样的帧和16kHz单声道音频
+
+    帧通过标准输出以rgb24原始数据流的形式读取；音频以s16le原始PCM写入一个独立管道，
+    调用start()后可从audio_stream读取，应在另一个线程中与frames()同时消费，
+    否则其中一路管道写满会使ffmpeg阻塞。不支持向子进程传递文件描述符的平台
+    （Windows）或视频没有音轨时，audio_stream为None，只输出帧。
+    """
+
+    def __init__(self, file_path: str, frame_interval: float = 10,
+                 media_info: Optional[Dict[str, Any]] = None, audio: bool = True):
+        self.file_path = file_path
+        self.frame_interval = frame_interval
+        self.media_info = media_info or probe_media(file_path)
+        self.audio = audio and self.media_info.get("has_audio", False) and os.name == 'posix'
+        self.audio_stream = None
+        self._proc = None
+
+        width = self.media_info.get("width")
+        height = self.media_info.get("height")
+        if not width or not height:
+            raise DemuxError(f"无法读取视频尺寸: {file_path}")
+        # ffmpeg默认按旋转信息自动旋转，输出尺寸需要相应交换
+        if self.media_info.get("rotation", 0) % 180 == 90:
+            width, height = height, width
+        self.frame_size = (width, height)
+
+    def _command(self, audio_fd: Optional[int]) -> list:
+        width, height = self.frame_size
+        cmd = [
+            get_ffmpeg_exe(), '-v', 'error', '-nostdin', '-i', self.file_path,
+            '-map', '0:v:0',
+            '-vf', f"fps=1/{self.frame_interval},scale={width}:{height}",
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1'
+        ]
+        if audio_fd is not None:
+            cmd += _audio_output_args(f'pipe:{audio_fd}')
+        return cmd
+
+    def start(self) -> None:
+        """启动ffmpeg进程（frames()会自动调用）；之后audio_stream可供读取"""
+        if self._proc is not None:
+            return
+
+        width, height = self.frame_size
+        audio_fd = None
+        pass_fds = ()
+        if self.audio:
+            read_fd, audio_fd = os.pipe()
+            pass_fds = (audio_fd,)
+
+        try:
+            self._proc = subprocess.Popen(
+                self._command(audio_fd),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=width * height * 3,
+                pass_fds=pass_fds
+            )
+        except OSError as e:
+            if audio_fd is not None:
+                os.close(read_fd)
+                os.close(audio_fd)
+            raise DemuxError(f"无法运行ffmpeg: {str(e)}") from e
+
+        if audio_fd is not None:
+            # 父进程关闭写端，ffmpeg退出后读端才能读到EOF
+            os.close(audio_fd)
+            self.audio_stream = os.fdopen(read_fd, 'rb')
+
+    def close(self) -> None:
+        """结束仍在运行的ffmpeg进程（正常读完所有帧后无操作），使audio_stream的读取方得到EOF"""
+        proc = self._proc
+        if proc is None or proc.poll() is not None:
+            return
+        proc.kill()
+        proc.wait()
+        for pipe in (proc.stdout, proc.stderr):
+            if pipe and not pipe.closed:
+                pipe.close()
+
+    def frames(self) -> Iterator[Tuple[float, Any]]:
+        """
+        解码视频，按间隔产出帧
+
+        Yields:
+            (时间（秒）, RGB格式的numpy数组)
+        """
+        import numpy as np
+
+        self.start()
+        proc = self._proc
+        width, height = self.frame_size
+        frame_bytes = width * height * 3
+
+        try:
+            index = 0
+            while True:
+                data = proc.stdout.read(frame_bytes)
+                if len(data) < frame_bytes:
+                    break
+                frame = np.frombuffer(data, dtype=np.uint8).reshape((height, width, 3))
+                yield index * self.frame_interval, frame
+                index += 1
+        finally:
+            proc.stdout.close()
+            stderr = proc.stderr.read().decode('utf-8', errors='replace')
+            proc.stderr.close()
+            returncode = proc.wait()
+
+        if returncode != 0:
+            raise DemuxError(f"ffmpeg解码视频失败: {stderr.strip()[-500:]}")
+        logging.info(f"视频单次解码完成: {os.path.basename(self.file_path)}，采样 {index} 帧")
+
+
+def find_text_subtitle_stream(media_info: Dict[str, Any], languages: Optional[list] = None) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """
+    选择一条文本字幕流
+
+    Args:
+        media_info: probe_media()的返回值
+        languages: 优先选择的语言代码列表（如['chi', 'eng']），为空时取第一条
+
+    Returns:
+        (在字幕流中的序号, 流信息)，没有文本字幕时返回None
+    """
+    subtitle_streams = [s for s in media_info.get("streams", []) if s["type"] == 'subtitle']
+    candidates = [
+        (position, stream) for position, stream in enumerate(subtitle_streams)
+        if stream["codec"] in TEXT_SUBTITLE_CODECS
+    ]
+    if not candidates:
+        return None
+
+    for language in languages or []:
+        for position, stream in candidates:
+            if stream.get("language") == language:
+                return position, stream
+    return candidates[0]
+
+
+def _srt_seconds(hours: str, minutes: str, seconds: str, millis: str) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 10 ** len(millis)
+
+
+def parse_srt(data: str) -> list:
+    """
+    解析SRT字幕
+
+    Returns:
+        [{"start": 秒, "end": 秒, "text": 文本}]，去除格式标签并合并连续重复的字幕
+    """
+    cues = []
+    for block in re.split(r"\r?\n\s*\r?\n", data.strip()):
+        lines = block.strip().splitlines()
+        for i, line in enumerate(lines):
+            match = _SRT_TIME_RE.search(line)
+            if not match:
+                continue
+            groups = match.groups()
+            text = " ".join(
+                _SUBTITLE_TAG_RE.sub('', text_line).strip() for text_line in lines[i + 1:]
+            ).strip()
+            if text:
+                start, end = _srt_seconds(*groups[:4]), _srt_seconds(*groups[4:])
+                if cues and cues[-1]["text"] == text:
+                    cues[-1]["end"] = end
+                else:
+                    cues.append({"start": start, "end": end, "text": text})
+            break
+    return cues
+
+
+def extract_subtitles(file_path: str, subtitle_index: int = 0) -> list:
+    """
+    将内嵌的文本字幕流转换为SRT并解析（不解码音视频，通常只需几十毫秒）
+
+    Args:
+        file_path: 视频文件路径
+        subtitle_index: 字幕流序号（在所有字幕流中的位置，对应ffmpeg的0:s:N）
+
+    Returns:
+        带时间戳的字幕列表，格式同parse_srt()
+    """
+    proc = subprocess.run(
+        [get_ffmpeg_exe(), '-v', 'error', '-nostdin', '-i', file_path,
+         '-map', f'0:s:{subtitle_index}', '-f', 'srt', 'pipe:1'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    if proc.returncode != 0:
+        stderr = proc.stderr.decode('utf-8', errors='replace')
+        raise RuntimeError(f"ffmpeg提取字幕失败: {stderr.strip()[-500:]}")
+    return parse_srt(proc.stdout.decode('utf-8', errors='replace'))
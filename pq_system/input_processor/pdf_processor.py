@@ -1,20 +1,105 @@
 import os
+import time
 import logging
-from typing import Dict, Any, Optional
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
-def process_pdf(file_path: str) -> Dict[str, Any]:
+from .cache import cached_extraction
+
+# 处理器版本：修改提取逻辑时递增，使旧的缓存结果失效
+PROCESSOR_VERSION = '6'
+
+# 页数达到该值才使用多进程提取，页数较少时进程启动开销大于收益
+PARALLEL_MIN_PAGES = 50
+
+# 每个工作进程平均分到的页段数，页段越多负载越均衡
+CHUNKS_PER_WORKER = 4
+
+# 流式提取时每个页段的页数，以及每个工作进程最多提前提交的页段数
+STREAM_CHUNK_PAGES = 20
+STREAM_CHUNKS_PER_WORKER = 2
+
+# OCR设置：文本层少于OCR_MIN_CHARS个字符，或有效字符比例低于OCR_MIN_VALID_RATIO的页面视为需要OCR
+OCR_DPI = 300
+OCR_LANG = 'chi_sim+eng'  # 中文+英文
+OCR_MIN_CHARS = 20
+OCR_MIN_VALID_RATIO = 0.5
+# 计为有效字符的标点（字母和数字之外）
+OCR_VALID_PUNCTUATION = frozenset(
+    '.,;:!?\'"()[]{}<>-_/\\%&+=*#@$~`|^'
+    '，。、；：！？‘’“”（）【】《》〈〉「」『』…—－·％'
+)
+
+def default_pdf_workers() -> int:
+    """PDF提取的默认工作进程数（也是共享进程池的大小），可通过环境变量PDF_EXTRACT_WORKERS配置"""
+    workers = int(os.environ.get('PDF_EXTRACT_WORKERS', 0))
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+def _pool_context():
+    # 不使用fork：调用方可能是持有数据库连接和线程的Web或工作进程
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """
+    获取进程内共享的PDF工作进程池
+    
+    进程池在第一次使用时创建，大小为default_pdf_workers()，所有任务的页段提取和OCR都提交到这个池，
+    同时处理多份PDF时总进程数也不会超过这个上限。
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=default_pdf_workers(), mp_context=_pool_context())
+        return _pool
+
+def shutdown_pdf_pool(wait: bool = False) -> None:
+    """关闭共享进程池；工作进程出错导致进程池不可用时也用它丢弃进程池，下次使用时重新创建"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _reset_after_fork() -> None:
+    # 子进程不能使用父进程的进程池
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def ocr_enabled() -> bool:
+    """是否对扫描页进行OCR，由环境变量PDF_OCR_ENABLED决定（默认开启）"""
+    return os.environ.get('PDF_OCR_ENABLED', '1') != '0'
+
+def _ocr_cache_key(kwargs) -> Dict[str, Any]:
+    # OCR开关计入缓存键，开启OCR后不会继续使用未OCR的缓存结果
+    return {'ocr': ocr_enabled()}
+
+@cached_extraction('pdf', PROCESSOR_VERSION, ignore=('workers',), key_extra=_ocr_cache_key)
+def process_pdf(file_path: str, workers: Optional[int] = None) -> Dict[str, Any]:
     """
     处理PDF文件并提取文本内容
     
     Args:
         file_path: PDF文件的路径
+        workers: 并行提取的工作进程数，None表示使用默认值，1表示单进程
         
     Returns:
-        包含处理结果的字典，包括提取的文本和元数据
+        包含处理结果的字典，包括提取的文本、逐页文本和元数据
     """
     result = {
         "success": False,
         "text": "",
+        "pages": [],
         "metadata": {},
         "error": None
     }
@@ -32,7 +117,8 @@ def process_pdf(file_path: str) -> Dict[str, Any]:
             return result
         
         # 提取PDF文本
-        text, metadata = extract_text_from_pdf(file_path)
+        pages, metadata = extract_pages_from_pdf(file_path, workers=workers)
+        text = "\n\n".join(page_text for _, page_text in pages)
         
         # 获取文件元数据
         file_metadata = {
@@ -47,6 +133,7 @@ def process_pdf(file_path: str) -> Dict[str, Any]:
         
         result["success"] = True
         result["text"] = text
+        result["pages"] = [{"page_number": page_number, "text": page_text} for page_number, page_text in pages]
         result["metadata"] = file_metadata
         
     except Exception as e:
@@ -55,22 +142,41 @@ def process_pdf(file_path: str) -> Dict[str, Any]:
     
     return result
 
-def extract_text_from_pdf(file_path: str) -> tuple:
+def extract_text_from_pdf(file_path: str, workers: Optional[int] = None, ocr: Optional[bool] = None) -> tuple:
     """
     从PDF文件中提取文本和元数据
     
     Returns:
-        tuple: (文本内容, 元数据字典)
+        tuple: (按页码顺序合并的文本内容, 元数据字典)
+    """
+    pages, metadata = extract_pages_from_pdf(file_path, workers=workers, ocr=ocr)
+    return "\n\n".join(text for _, text in pages), metadata
+
+def extract_pages_from_pdf(file_path: str, workers: Optional[int] = None, ocr: Optional[bool] = None) -> tuple:
+    """
+    从PDF文件中逐页提取文本和元数据
+    
+    页数较多时把页码范围切分成多个页段，交给进程池并行提取，再按页码顺序拼接。
+    没有文本层的页面（扫描页）单独进行OCR。
+    
+    Args:
+        file_path: PDF文件的路径
+        workers: 工作进程数，None表示使用默认值，1表示单进程
+        ocr: 是否对扫描页进行OCR，None表示由环境变量PDF_OCR_ENABLED决定（默认开启）
+    
+    Returns:
+        tuple: ((页码, 文本)列表, 元数据字典)，元数据中的page_timings为每页提取耗时（秒）
     """
     try:
         import PyPDF2
         
-        text_content = []
         metadata = {}
+        started = time.perf_counter()
         
         with open(file_path, 'rb') as file:
             # 创建PDF reader对象
             pdf_reader = PyPDF2.PdfReader(file)
+            page_count = len(pdf_reader.pages)
             
             # 提取元数据
             if pdf_reader.metadata:
@@ -80,55 +186,289 @@ def extract_text_from_pdf(file_path: str) -> tuple:
                     "subject": pdf_reader.metadata.get("/Subject", ""),
                     "creator": pdf_reader.metadata.get("/Creator", ""),
                     "producer": pdf_reader.metadata.get("/Producer", ""),
-                    "page_count": len(pdf_reader.pages)
+                    "page_count": page_count
                 }
             else:
-                metadata = {"page_count": len(pdf_reader.pages)}
+                metadata = {"page_count": page_count}
             
-            # 提取每一页的文本
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text_content.append(page.extract_text())
+            if workers is None:
+                workers = default_pdf_workers()
+            workers = max(1, min(workers, page_count))
+            
+            pages = None
+            if workers > 1 and page_count >= PARALLEL_MIN_PAGES:
+                pages = _extract_pages_parallel(file_path, page_count, workers)
+                if pages is not None:
+                    metadata["extraction_workers"] = workers
+            if pages is None:
+                # 页数较少或并行提取失败时在当前进程中提取
+                pages = [_extract_page(pdf_reader, i) for i in range(page_count)]
+                metadata["extraction_workers"] = 1
+        
+        metadata["page_timings"] = [round(seconds, 4) for _, _, seconds in pages]
+        
+        # 只对没有文本层或文本层为乱码的页面进行OCR
+        if ocr is None:
+            ocr = ocr_enabled()
+        if ocr:
+            scanned_pages = [page_number for page_number, text, _ in pages if page_needs_ocr(text)]
+            if scanned_pages:
+                ocr_started = time.perf_counter()
+                ocr_texts = ocr_pages(file_path, scanned_pages, workers=workers)
+                pages = [
+                    (page_number, ocr_texts.get(page_number) or text, seconds)
+                    for page_number, text, seconds in pages
+                ]
+                metadata["ocr_pages"] = sorted(page for page, text in ocr_texts.items() if text is not None)
+                metadata["ocr_seconds"] = round(time.perf_counter() - ocr_started, 4)
+                _record_ocr_failures(metadata, [page for page, text in ocr_texts.items() if text is None])
         
-        # 合并所有页面的文本
-        full_text = "\n\n".join(text_content)
+        metadata["extraction_seconds"] = round(time.perf_counter() - started, 4)
         
-        return full_text, metadata
+        return [(page_number, text) for page_number, text, _ in pages], metadata
         
     except ImportError:
         logging.warning("未找到PyPDF2库，无法处理PDF文件。")
-        return "需要安装PyPDF2库以处理PDF文件。", {}
+        return [(1, "需要安装PyPDF2库以处理PDF文件。")], {}
 
-def extract_text_with_ocr(file_path: str) -> str:
+def iter_pdf_pages(file_path: str, ocr: Optional[bool] = None, workers: Optional[int] = None,
+                   metadata: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[int, str]]:
     """
-    使用OCR从PDF中提取文本（用于扫描PDF文件）
+    逐页提取PDF文本的生成器，不在内存中拼接整篇文档
+    
+    页数较多时按页段提交到共享进程池并行提取，按页码顺序产出；同时提交的页段数有上限，
+    内存中尚未产出的页面数量与文档长度无关。每个页段中的扫描页同样在进程池中并行OCR。
     
     Args:
         file_path: PDF文件的路径
+        ocr: 是否对扫描页进行OCR，None表示由环境变量PDF_OCR_ENABLED决定
+        workers: 工作进程数，None表示使用默认值，1表示单进程
+        metadata: 可选，传入字典时在提取完成后写入extraction_workers、ocr_pages、ocr_failed_pages和partial
+        
+    Yields:
+        (页码, 文本)，页码从1开始
+    """
+    if ocr is None:
+        ocr = ocr_enabled()
+    if metadata is None:
+        metadata = {}
+    
+    page_count = get_pdf_page_count(file_path)
+    if workers is None:
+        workers = default_pdf_workers()
+    workers = max(1, min(workers, page_count))
+    ranges = [(start, min(start + STREAM_CHUNK_PAGES, page_count)) for start in range(0, page_count, STREAM_CHUNK_PAGES)]
+    
+    ocr_done = []
+    ocr_failed = []
+    ocr_ready = None
+    for pages in _iter_page_ranges(file_path, ranges, workers, metadata):
+        if ocr:
+            scanned_pages = [page_number for page_number, text, _ in pages if page_needs_ocr(text)]
+            if scanned_pages and ocr_ready is None:
+                # 只在第一次遇到扫描页时检查OCR库，避免每个页段重复记录警告
+                ocr_ready = _ocr_available()
+            if scanned_pages and not ocr_ready:
+                ocr_failed.extend(scanned_pages)
+            elif scanned_pages:
+                ocr_texts = ocr_pages(file_path, scanned_pages, workers=workers)
+                pages = [
+                    (page_number, ocr_texts.get(page_number) or text, seconds)
+                    for page_number, text, seconds in pages
+                ]
+                ocr_done.extend(page for page in scanned_pages if ocr_texts.get(page) is not None)
+                ocr_failed.extend(page for page in scanned_pages if ocr_texts.get(page) is None)
+        for page_number, text, _ in pages:
+            yield page_number, text
+    
+    if ocr_done:
+        metadata["ocr_pages"] = ocr_done
+    _record_ocr_failures(metadata, ocr_failed)
+
+def _iter_page_ranges(file_path: str, ranges: List[Tuple[int, int]], workers: int,
+                      metadata: Dict[str, Any]) -> Iterator[List[Tuple[int, str, float]]]:
+    """
+    按顺序产出各页段的(页码, 文本, 耗时)列表
+    
+    并行时最多提前提交workers * STREAM_CHUNKS_PER_WORKER个页段；进程池不可用时从尚未产出的页段起改为单进程提取。
+    """
+    done = 0
+    page_count = ranges[-1][1] if ranges else 0
+    if workers > 1 and page_count >= PARALLEL_MIN_PAGES:
+        pending = deque()
+        try:
+            executor = get_pdf_pool()
+            metadata["extraction_workers"] = workers
+            while done < len(ranges):
+                while done + len(pending) < len(ranges) and len(pending) < workers * STREAM_CHUNKS_PER_WORKER:
+                    start, end = ranges[done + len(pending)]
+                    pending.append(executor.submit(_extract_page_range, file_path, start, end))
+                pages = pending.popleft().result()
+                done += 1
+                yield pages
+        except (OSError, RuntimeError) as e:
+            logging.warning(f"并行提取PDF失败，剩余页面改用单进程提取: {str(e)}")
+            metadata.pop("extraction_workers", None)
+            shutdown_pdf_pool()
+        finally:
+            # 调用方提前结束迭代时不再执行已提交的页段
+            for future in pending:
+                future.cancel()
+    
+    if done < len(ranges):
+        import PyPDF2
         
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for start, end in ranges[done:]:
+                yield [_extract_page(pdf_reader, i) for i in range(start, end)]
+
+def get_pdf_page_count(file_path: str) -> int:
+    """读取PDF页数（只解析文档结构，不提取文本）"""
+    import PyPDF2
+    
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def _extract_page(pdf_reader, index: int) -> Tuple[int, str, float]:
+    """提取单页文本，返回(页码, 文本, 耗时)"""
+    started = time.perf_counter()
+    text = pdf_reader.pages[index].extract_text() or ""
+    return index + 1, text, time.perf_counter() - started
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, str, float]]:
+    """在工作进程中打开PDF并提取[start, end)范围内的页面"""
+    import PyPDF2
+    
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [_extract_page(pdf_reader, i) for i in range(start, end)]
+
+def _extract_pages_parallel(file_path: str, page_count: int, workers: int) -> Optional[List[Tuple[int, str, float]]]:
+    """
+    使用进程池并行提取所有页面
+    
     Returns:
-        提取的文本内容
+        按页码排序的(页码, 文本, 耗时)列表；进程池不可用时返回None，由调用方退回单进程提取
+    """
+    num_chunks = min(page_count, workers * CHUNKS_PER_WORKER)
+    chunk_size = -(-page_count // num_chunks)
+    ranges = [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+    
+    try:
+        executor = get_pdf_pool()
+        futures = [executor.submit(_extract_page_range, file_path, start, end) for start, end in ranges]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+        return pages
+    except (OSError, RuntimeError) as e:
+        logging.warning(f"并行提取PDF失败，改用单进程提取: {str(e)}")
+        shutdown_pdf_pool()
+        return None
+
+def page_needs_ocr(text: str) -> bool:
+    """
+    判断页面的文本层是否缺失或为乱码
+    
+    有效字符只包括字母、数字（含中文）和常见标点；
+    替换字符、私有区字符和控制字符（字体编码缺失时常见）以及其他符号都计为无效。
     """
+    stripped = "".join(text.split()) if text else ""
+    if len(stripped) < OCR_MIN_CHARS:
+        return True
+    
+    # 私有区、未分配和控制字符的isalnum()都为False
+    valid = sum(1 for char in stripped if char.isalnum() or char in OCR_VALID_PUNCTUATION)
+    return valid / len(stripped) < OCR_MIN_VALID_RATIO
+
+def _record_ocr_failures(metadata: Dict[str, Any], failed_pages: List[int]) -> None:
+    """有页面OCR失败时记录到元数据，并标记为不完整的结果（不写入提取结果缓存）"""
+    if failed_pages:
+        logging.warning(f"{len(failed_pages)}个页面OCR失败，保留原文本层: {sorted(failed_pages)[:10]}")
+        metadata["ocr_failed_pages"] = sorted(failed_pages)
+        metadata["partial"] = True
+
+def _ocr_page(file_path: str, page_number: int) -> Tuple[int, Optional[str]]:
+    """只栅格化并识别一页，返回(页码, 文本)；识别失败时文本为None"""
     try:
         import pytesseract
         from pdf2image import convert_from_path
-        from PIL import Image
-        
-        # 将PDF转换为图像
-        pages = convert_from_path(file_path, 300)  # DPI=300
-        
-        text_content = []
         
-        # 对每个页面进行OCR处理
-        for i, page in enumerate(pages):
-            text = pytesseract.image_to_string(page, lang='chi_sim+eng')  # 中文+英文
-            text_content.append(text)
-        
-        # 合并所有页面的文本
-        full_text = "\n\n".join(text_content)
+        images = convert_from_path(file_path, OCR_DPI, first_page=page_number, last_page=page_number)
+        text = pytesseract.image_to_string(images[0], lang=OCR_LANG) if images else ""
+        return page_number, text
+    except Exception as e:
+        # 失败页面由调用方汇总记录（缺少tesseract时每页都会失败）
+        logging.debug(f"第{page_number}页OCR失败: {str(e)}")
+        return page_number, None
+
+def _ocr_available() -> bool:
+    """检查OCR相关库是否可用，不可用时记录警告"""
+    try:
+        import pytesseract
+        import pdf2image
+        return True
+    except ImportError:
+        logging.warning("未找到OCR相关库，跳过扫描页的OCR处理。")
+        return False
+
+def ocr_pages(file_path: str, page_numbers: List[int], workers: Optional[int] = None) -> Dict[int, Optional[str]]:
+    """
+    对指定页面进行OCR，每个任务只栅格化一页，多个页面在进程池中并行识别
+    
+    Args:
+        file_path: PDF文件的路径
+        page_numbers: 需要OCR的页码列表（从1开始）
+        workers: 工作进程数，None表示使用默认值
         
-        return full_text
+    Returns:
+        页码到识别文本的字典，识别失败的页面（包括缺少OCR相关库时的所有页面）为None
+    """
+    if not _ocr_available():
+        return {page_number: None for page_number in page_numbers}
+    
+    if workers is None:
+        workers = default_pdf_workers()
+    workers = max(1, min(workers, len(page_numbers)))
+    
+    results = {}
+    if workers > 1:
+        try:
+            for page_number, text in get_pdf_pool().map(_ocr_page, [file_path] * len(page_numbers), page_numbers):
+                results[page_number] = text
+            return results
+        except (OSError, RuntimeError) as e:
+            logging.warning(f"并行OCR失败，改为逐页处理: {str(e)}")
+            shutdown_pdf_pool()
+    
+    for page_number in page_numbers:
+        if page_number not in results:
+            results[page_number] = _ocr_page(file_path, page_number)[1]
+    return results
+
+def extract_text_with_ocr(file_path: str, workers: Optional[int] = None) -> str:
+    """
+    使用OCR从PDF中提取文本（用于扫描PDF文件）
+    
+    逐页栅格化并在进程池中并行识别，不会一次把整份文档的图像载入内存。
+    
+    Args:
+        file_path: PDF文件的路径
+        workers: 工作进程数，None表示使用默认值
         
+    Returns:
+        提取的文本内容
+    """
+    try:
+        import pytesseract
+        import pdf2image
     except ImportError:
         logging.warning("未找到OCR相关库，无法进行OCR处理。")
-        return "需要安装pytesseract和pdf2image库以进行OCR处理。" 
\ No newline at end of file
+        return "需要安装pytesseract和pdf2image库以进行OCR处理。"
+    
+    page_count = get_pdf_page_count(file_path)
+    texts = ocr_pages(file_path, list(range(1, page_count + 1)), workers=workers)
+    
+    # 合并所有页面的文本
+    return "\n\n".join(texts.get(page_number) or "" for page_number in range(1, page_count + 1))
@@ -0,0 +1,118 @@
+import os
+import logging
+from typing import Callable, Dict, Optional, Union
+
+
+class SpeechRecognizer:
+    """
+    Speech-to-text backend interface
+
+    Implementations receive raw little-endian PCM audio (one speech segment)
+    and return its transcript. They must be safe to call from several threads
+    at once, because segments are transcribed concurrently.
+    """
+
+    name = 'base'
+
+    def transcribe(self, pcm: bytes, sample_rate: int, sample_width: int) -> str:
+        """
+        Transcribe one segment of audio
+
+        Args:
+            pcm (bytes): Mono PCM samples
+            sample_rate (int): Samples per second
+            sample_width (int): Bytes per sample
+
+        Returns:
+            str: The transcript, or an empty string when nothing was recognized
+        """
+        raise NotImplementedError
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the backend and settings that influence its output"""
+        return self.name
+
+
+class GoogleRecognizer(SpeechRecognizer):
+    """Google Web Speech API through the SpeechRecognition package"""
+
+    name = 'google'
+
+    def __init__(self, language: Optional[str] = None):
+        self.language = language or os.environ.get('SPEECH_LANGUAGE', 'en-US')
+
+    def transcribe(self, pcm: bytes, sample_rate: int, sample_width: int) -> str:
+        import speech_recognition as sr
+
+        audio_data = sr.AudioData(bytes(pcm), sample_rate, sample_width)
+        try:
+            return sr.Recognizer().recognize_google(audio_data, language=self.language)
+        except sr.UnknownValueError:
+            # Segment contained no intelligible speech
+            return ""
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}:{self.language}"
+
+
+class SphinxRecognizer(SpeechRecognizer):
+    """Offline CMU Sphinx engine (requires the pocketsphinx package)"""
+
+    name = 'sphinx'
+
+    def __init__(self, language: Optional[str] = None):
+        self.language = language or os.environ.get('SPEECH_LANGUAGE', 'en-US')
+
+    def transcribe(self, pcm: bytes, sample_rate: int, sample_width: int) -> str:
+        import speech_recognition as sr
+
+        audio_data = sr.AudioData(bytes(pcm), sample_rate, sample_width)
+        try:
+            return sr.Recognizer().recognize_sphinx(audio_data, language=self.language)
+        except sr.UnknownValueError:
+            return ""
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}:{self.language}"
+
+
+_RECOGNIZERS: Dict[str, Callable[[], SpeechRecognizer]] = {
+    'google': GoogleRecognizer,
+    'sphinx': SphinxRecognizer,
+}
+
+
+def register_recognizer(name: str, factory: Callable[[], SpeechRecognizer]) -> None:
+    """
+    Register a recognizer backend so it can be selected by name
+
+    Args:
+        name (str): Name used in SPEECH_RECOGNIZER or get_recognizer()
+        factory (callable): Zero-argument callable returning a SpeechRecognizer
+    """
+    _RECOGNIZERS[name] = factory
+
+
+def get_recognizer(recognizer: Union[str, SpeechRecognizer, None] = None) -> SpeechRecognizer:
+    """
+    Resolve a recognizer backend
+
+    Args:
+        recognizer: A SpeechRecognizer instance, a registered name, or None to
+            use the SPEECH_RECOGNIZER environment variable (default 'google')
+
+    Returns:
+        SpeechRecognizer: The backend instance
+    """
+    if isinstance(recognizer, SpeechRecognizer):
+        return recognizer
+
+    name = recognizer or os.environ.get('SPEECH_RECOGNIZER', 'google')
+    try:
+        return _RECOGNIZERS[name]()
+    except KeyError:
+        logging.warning(f"Unknown speech recognizer '{name}', falling back to google")
+        return GoogleRecognizer()
@@ -2,6 +2,12 @@ import os
 import logging
 from typing import Dict, Any, Optional
 
+from .cache import cached_extraction
+
+# 处理器版本：修改提取逻辑时递增，使旧的缓存结果失效
+PROCESSOR_VERSION = '1'
+
+@cached_extraction('text', PROCESSOR_VERSION)
 def process_text(file_path: str) -> Dict[str, Any]:
     """
     处理文本文件并返回提取的文本内容
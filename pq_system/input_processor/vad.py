@@ -0,0 +1,147 @@
+import math
+import logging
+import subprocess
+from collections import deque
+from typing import BinaryIO, Iterator, Tuple
+
+import numpy as np
+
+from .media import AUDIO_SAMPLE_RATE, AUDIO_SAMPLE_WIDTH, audio_decode_command
+
+FRAME_MS = 30  # analysis window
+MIN_SILENCE_MS = 500  # minimum length of silence between segments
+SILENCE_OFFSET_DB = 14  # silence threshold below the average loudness so far
+SILENCE_FLOOR_DB = -60  # frames quieter than this are always silence
+KEEP_SILENCE_MS = 500  # padding kept around each segment
+MAX_SEGMENT_MS = 50 * 1000  # recognizers reject overly long requests
+
+
+class StreamingSegmenter:
+    """
+    Energy-based voice activity segmenter for mono s16le PCM streams
+
+    Frames are read from the stream one window at a time and speech segments
+    are emitted as soon as the silence after them is long enough, so memory
+    is bounded by MAX_SEGMENT_MS rather than by the length of the recording.
+
+    The silence threshold follows the running average loudness of the audio
+    read so far, the streaming equivalent of ``audio.dBFS - 14``.
+    """
+
+    def __init__(self, sample_rate: int = AUDIO_SAMPLE_RATE, frame_ms: int = FRAME_MS,
+                 min_silence_ms: int = MIN_SILENCE_MS, keep_silence_ms: int = KEEP_SILENCE_MS,
+                 max_segment_ms: int = MAX_SEGMENT_MS, silence_offset_db: float = SILENCE_OFFSET_DB,
+                 silence_floor_db: float = SILENCE_FLOOR_DB):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * AUDIO_SAMPLE_WIDTH
+        self.min_silence_frames = max(1, min_silence_ms // frame_ms)
+        self.keep_frames = keep_silence_ms // frame_ms
+        self.max_segment_frames = max(1, max_segment_ms // frame_ms)
+        self.silence_offset_db = silence_offset_db
+        self.silence_floor_db = silence_floor_db
+
+        self.position_ms = 0
+        self._power_sum = 0.0
+        self._sample_count = 0
+
+    def _is_speech(self, frame: bytes) -> bool:
+        samples = np.frombuffer(frame, dtype='<i2').astype(np.float64)
+        power = float(np.dot(samples, samples))
+        self._power_sum += power
+        self._sample_count += len(samples)
+
+        if not power:
+            return False
+        level_db = 10 * math.log10(power / len(samples) / 32768.0 ** 2)
+        average_db = 10 * math.log10(self._power_sum / self._sample_count / 32768.0 ** 2)
+        return level_db > max(self.silence_floor_db, average_db - self.silence_offset_db)
+
+    def segments(self, stream: BinaryIO) -> Iterator[Tuple[int, int, bytes]]:
+        """
+        Split a PCM stream into speech segments
+
+        Args:
+            stream: Readable binary stream of 16-bit little-endian mono PCM
+
+        Yields:
+            (start_ms, end_ms, pcm_bytes) for each segment, in time order
+        """
+        preroll = deque(maxlen=self.keep_frames or None)
+        segment = []
+        segment_start = 0
+        silence_run = 0
+        index = 0
+
+        def emit(trailing_silence):
+            keep = min(trailing_silence, self.keep_frames)
+            frames = segment[:len(segment) - trailing_silence + keep]
+            start_ms = segment_start * self.frame_ms
+            return start_ms, start_ms + len(frames) * self.frame_ms, b''.join(frames)
+
+        while True:
+            frame = stream.read(self.frame_bytes)
+            if len(frame) < AUDIO_SAMPLE_WIDTH:
+                break
+            frame = frame[:len(frame) - len(frame) % AUDIO_SAMPLE_WIDTH]
+            speech = self._is_speech(frame)
+
+            if not segment:
+                if speech:
+                    segment = list(preroll) + [frame]
+                    segment_start = index - len(preroll)
+                    preroll.clear()
+                    silence_run = 0
+                elif self.keep_frames:
+                    preroll.append(frame)
+            else:
+                segment.append(frame)
+                silence_run = 0 if speech else silence_run + 1
+
+                if silence_run >= self.min_silence_frames:
+                    yield emit(silence_run)
+                    if self.keep_frames:
+                        preroll.extend(segment[-min(silence_run, self.keep_frames):])
+                    segment = []
+                elif len(segment) >= self.max_segment_frames:
+                    # Cut overly long speech runs into pieces the recognizer accepts
+                    yield emit(0)
+                    segment = []
+                    silence_run = 0
+
+            index += 1
+            self.position_ms = self._sample_count * 1000 // self.sample_rate
+
+        if segment:
+            yield emit(silence_run)
+
+
+def iter_speech_segments(file_path: str, segmenter: StreamingSegmenter = None) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Decode a media file through an ffmpeg pipe and stream its speech segments
+
+    Args:
+        file_path (str): Audio or video file
+        segmenter (StreamingSegmenter): Segmenter to use; its position_ms holds
+            the decoded duration once iteration is finished
+
+    Yields:
+        (start_ms, end_ms, pcm_bytes) for each segment, in time order
+    """
+    segmenter = segmenter or StreamingSegmenter()
+    proc = subprocess.Popen(
+        audio_decode_command(file_path),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    try:
+        yield from segmenter.segments(proc.stdout)
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read().decode('utf-8', errors='replace')
+        proc.stderr.close()
+        returncode = proc.wait()
+
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode audio: {stderr.strip()[-500:]}")
+    logging.info(f"Segmented {segmenter.position_ms / 1000.0:.1f}s of audio from {file_path}")
@@ -1,8 +1,32 @@
 import os
+import time
 import logging
-import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 
+from .cache import cached_extraction
+
+# 处理器版本：修改提取逻辑时递增，使旧的缓存结果失效
+PROCESSOR_VERSION = '7'
+
+# 帧采样间隔（秒）
+FRAME_INTERVAL = 10
+
+# 画面变化检测：把帧缩成SCENE_GRID x SCENE_GRID个区块的平均亮度，
+# 与上一次OCR的帧相比没有区块变化超过SCENE_BLOCK_DIFF（0-255）时视为同一画面，跳过OCR
+SCENE_GRID = 16
+SCENE_BLOCK_DIFF = 12
+
+# 每个OCR工作线程最多排队的帧数，限制已解码但尚未识别的帧占用的内存
+OCR_QUEUE_PER_WORKER = 2
+
+def default_ocr_workers() -> int:
+    """视频帧OCR的默认并发数，可通过环境变量VIDEO_OCR_WORKERS配置"""
+    workers = int(os.environ.get('VIDEO_OCR_WORKERS', 0))
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+@cached_extraction('video', PROCESSOR_VERSION)
 def process_video(file_path: str) -> Dict[str, Any]:
     """
     处理视频文件并提取音频和文本内容
@@ -18,6 +42,7 @@ def process_video(file_path: str) -> Dict[str, Any]:
         "text": "",
         "frames_with_text": [],
         "audio_text": "",
+        "transcript_segments": [],
         "metadata": {},
         "error": None
     }
@@ -35,14 +60,22 @@ def process_video(file_path: str) -> Dict[str, Any]:
             result["error"] = f"不支持的文件格式: {ext}. 支持的格式: {', '.join(supported_extensions)}"
             return result
         
-        # 获取视频元数据
-        metadata = extract_video_metadata(file_path)
+        from .media import DemuxError
         
-        # 提取音频并进行语音转文本
-        audio_text = extract_audio_from_video(file_path)
-        
-        # 提取视频帧并识别文本
-        frames_with_text = extract_frames_with_text(file_path)
+        # 单次解码同时获取元数据、音频和采样帧；ffmpeg无法读取或解码视频时退回逐项处理
+        # （帧OCR和语音识别的错误在各自分支中处理，不会触发退回），两种方式下两者都并发执行
+        try:
+            metadata, (audio_text, transcript_segments), frames_with_text = _process_video_single_pass(file_path)
+        except DemuxError as e:
+            logging.warning(f"单次解码视频失败，改为逐项处理: {str(e)}")
+            metadata = extract_video_metadata(file_path)
+            (audio_text, transcript_segments, audio_error), frames_with_text, metadata["timings"] = \
+                _run_concurrently(
+                    lambda: _transcribe_audio_file(file_path),
+                    lambda: extract_frames_with_text(file_path)
+                )
+            metadata["transcript_source"] = "asr"
+            _record_audio_error(metadata, audio_error)
         
         # 合并所有文本内容
         all_text = [audio_text] if audio_text else []
@@ -67,6 +100,7 @@ def process_video(file_path: str) -> Dict[str, Any]:
         result["success"] = True
         result["text"] = combined_text
         result["audio_text"] = audio_text
+        result["transcript_segments"] = transcript_segments
         result["frames_with_text"] = frames_with_text
         result["metadata"] = file_metadata
         
@@ -76,6 +110,316 @@ def process_video(file_path: str) -> Dict[str, Any]:
     
     return result
 
+def _process_video_single_pass(file_path: str, interval: int = FRAME_INTERVAL) -> tuple:
+    """
+    对视频容器只解码一次，同时得到元数据、语音识别文本和帧OCR结果
+    
+    Args:
+        file_path: 视频文件路径
+        interval: 帧提取间隔（秒）
+        
+    视频带有文本字幕流时直接使用字幕作为语音文本，不再解码音频和进行语音识别。
+    
+    Returns:
+        tuple: (元数据字典, (音频文本, 带时间戳的文本片段), 帧信息列表)
+    """
+    from .media import VideoDemuxer, probe_media
+    
+    media_info = probe_media(file_path)
+    width, height = media_info.get("width"), media_info.get("height")
+    metadata = {
+        "duration_seconds": media_info.get("duration_seconds"),
+        "fps": media_info.get("fps"),
+        "width": width,
+        "height": height,
+        "aspect_ratio": round(width / height, 2) if width and height else None,
+        "rotation": media_info.get("rotation", 0)
+    }
+    fps = metadata["fps"] or 0
+    
+    subtitles = _load_subtitles(file_path, media_info, metadata)
+    
+    demuxer = VideoDemuxer(file_path, frame_interval=interval, media_info=media_info,
+                           audio=subtitles is None)
+    demuxer.start()
+    
+    if subtitles is not None:
+        metadata["transcript_source"] = "subtitles"
+        audio_branch = lambda: ("\n".join(cue["text"] for cue in subtitles), subtitles, None)
+    elif demuxer.audio_stream is not None:
+        metadata["transcript_source"] = "asr"
+        audio_branch = lambda: _transcribe_audio_stream(demuxer.audio_stream)
+    elif media_info.get("has_audio"):
+        # 无法通过管道输出音频的平台上单独解码音轨（不解码画面）
+        metadata["transcript_source"] = "asr"
+        audio_branch = lambda: _transcribe_audio_file(file_path)
+    else:
+        metadata["transcript_source"] = None
+        audio_branch = lambda: ("", [], None)
+    
+    def frames_branch():
+        frame_iter = demuxer.frames()
+        try:
+            return collect_frame_text(frame_iter, fps)
+        finally:
+            # 帧OCR出错时也要结束ffmpeg，否则音频分支会一直等待管道
+            frame_iter.close()
+            demuxer.close()
+    
+    (text, segments, audio_error), (frames, frame_stats), metadata["timings"] = \
+        _run_concurrently(audio_branch, frames_branch)
+    metadata["frame_ocr"] = frame_stats
+    if frame_stats.get("ocr_error"):
+        # 部分帧未能识别，结果不完整（不写入提取结果缓存）
+        metadata["partial"] = True
+    _record_audio_error(metadata, audio_error)
+    
+    return metadata, (text, segments), frames
+
+def _record_audio_error(metadata: Dict[str, Any], audio_error: Optional[str]) -> None:
+    """语音识别失败或只部分成功时记录到元数据，并标记为不完整的结果（不写入提取结果缓存）"""
+    if audio_error:
+        metadata["audio_error"] = audio_error
+        metadata["partial"] = True
+
+def _load_subtitles(file_path: str, media_info: Dict[str, Any], metadata: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    读取视频内嵌的文本字幕
+    
+    可通过环境变量SUBTITLE_LANGUAGES（逗号分隔的语言代码，如chi,eng）指定优先使用的字幕语言。
+    
+    Returns:
+        带时间戳的字幕列表，没有可用的文本字幕时返回None
+    """
+    from .media import find_text_subtitle_stream, extract_subtitles
+    
+    languages = [lang.strip() for lang in os.environ.get('SUBTITLE_LANGUAGES', '').split(',') if lang.strip()]
+    selected = find_text_subtitle_stream(media_info, languages)
+    if selected is None:
+        return None
+    
+    position, stream = selected
+    try:
+        started = time.perf_counter()
+        subtitles = extract_subtitles(file_path, position)
+    except Exception as e:
+        logging.warning(f"提取内嵌字幕失败，改用语音识别: {str(e)}")
+        return None
+    if not subtitles:
+        return None
+    
+    metadata["subtitle_stream"] = {
+        "index": stream["index"],
+        "codec": stream["codec"],
+        "language": stream.get("language"),
+        "cue_count": len(subtitles),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+    return subtitles
+
+def _run_concurrently(audio_branch, frames_branch) -> tuple:
+    """
+    在后台线程运行语音识别分支，同时在当前线程运行帧OCR分支
+    
+    语音识别主要等待网络，帧OCR主要占用CPU，并发执行时总耗时接近较慢的一支。
+    
+    Args:
+        audio_branch: 无参数函数，返回音频转写结果
+        frames_branch: 无参数函数，返回帧OCR结果
+        
+    Returns:
+        tuple: (音频转写结果, 帧OCR结果, 各分支耗时字典)
+    """
+    def timed(func):
+        started = time.perf_counter()
+        return func(), time.perf_counter() - started
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pq-video-audio") as executor:
+        audio_future = executor.submit(timed, audio_branch)
+        frames_result, frames_seconds = timed(frames_branch)
+        audio_text, audio_seconds = audio_future.result()
+    
+    timings = {
+        "audio_seconds": round(audio_seconds, 3),
+        "frames_seconds": round(frames_seconds, 3),
+        "wall_seconds": round(time.perf_counter() - started, 3)
+    }
+    return audio_text, frames_result, timings
+
+def frame_signature(frame):
+    """
+    计算帧的缩略签名：把灰度图划分为SCENE_GRID x SCENE_GRID个区块并取各区块的平均亮度
+    
+    Args:
+        frame: RGB格式的帧（numpy数组）
+        
+    Returns:
+        SCENE_GRID x SCENE_GRID的numpy数组
+    """
+    import numpy as np
+    
+    gray = np.asarray(frame, dtype=np.float32).mean(axis=2)
+    height, width = gray.shape
+    block_h, block_w = max(1, height // SCENE_GRID), max(1, width // SCENE_GRID)
+    gray = gray[:block_h * SCENE_GRID, :block_w * SCENE_GRID]
+    return gray.reshape(SCENE_GRID, block_h, SCENE_GRID, block_w).mean(axis=(1, 3))
+
+def frame_changed(previous, current) -> bool:
+    """任一区块的平均亮度变化超过SCENE_BLOCK_DIFF时认为画面发生了变化"""
+    import numpy as np
+    
+    if previous is None or previous.shape != current.shape:
+        return True
+    return bool(np.abs(current - previous).max() > SCENE_BLOCK_DIFF)
+
+def _normalize_ocr_text(text: str) -> str:
+    """归一化OCR文本（合并空白、忽略大小写），用于判断重复"""
+    return " ".join(text.split()).lower()
+
+def collect_frame_text(frames, fps: float, workers: Optional[int] = None) -> tuple:
+    """
+    对采样帧进行OCR，只在画面发生变化时调用tesseract，并合并重复的识别结果
+    
+    画面发生变化的帧放入有界队列，由OCR线程池并发识别（tesseract在子进程中运行，
+    线程等待期间不占用GIL）。队列满时解码端等待最早的帧识别完成，
+    因此内存占用有上限，结果也按时间顺序处理。
+    
+    Args:
+        frames: 产出(时间, RGB帧)的可迭代对象
+        fps: 视频帧率，用于计算帧序号
+        workers: OCR并发数，None表示使用默认值
+        
+    Returns:
+        tuple: (帧信息列表, 统计信息字典)
+    """
+    if workers is None:
+        workers = default_ocr_workers()
+    
+    results = []
+    seen_texts = set()
+    last_signature = None
+    stats = {"sampled": 0, "ocr_calls": 0, "unchanged_skipped": 0, "duplicates_skipped": 0,
+             "ocr_errors": 0, "ocr_workers": workers}
+    ocr_available = True
+    
+    def finish(t, future):
+        nonlocal ocr_available
+        try:
+            text = future.result()
+        except Exception as e:
+            # 单帧识别失败只跳过该帧，不影响其他帧和语音识别结果
+            stats["ocr_errors"] += 1
+            if "ocr_error" not in stats:
+                stats["ocr_error"] = str(e)
+                logging.warning(f"视频帧OCR失败: {str(e)}")
+            if isinstance(e, OSError):
+                # 找不到tesseract等环境问题，后续帧也无法识别
+                ocr_available = False
+            return
+        if not text:
+            return
+        
+        key = _normalize_ocr_text(text)
+        if key in seen_texts:
+            stats["duplicates_skipped"] += 1
+            return
+        seen_texts.add(key)
+        
+        results.append({
+            "time": t,
+            "text": text,
+            "frame_number": int(t * fps)
+        })
+    
+    pending = deque()
+    max_pending = max(1, workers * OCR_QUEUE_PER_WORKER)
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="pq-frame-ocr") as executor:
+        for t, frame in frames:
+            stats["sampled"] += 1
+            
+            if not ocr_available:
+                # 仍然读完所有帧，解码进程才能继续输出音频
+                continue
+            
+            signature = frame_signature(frame)
+            if not frame_changed(last_signature, signature):
+                stats["unchanged_skipped"] += 1
+                continue
+            last_signature = signature
+            
+            # 队列已满时等待最早提交的帧识别完成（反压解码）
+            while len(pending) >= max_pending:
+                finish(*pending.popleft())
+            
+            stats["ocr_calls"] += 1
+            pending.append((t, executor.submit(_ocr_frame, frame)))
+        
+        while pending:
+            finish(*pending.popleft())
+    
+    return results, stats
+
+def _ocr_frame(frame) -> str:
+    """
+    识别单帧（RGB）中的文本
+    
+    Returns:
+        识别出的文本，缺少OCR库或没有文本时返回空字符串
+    """
+    try:
+        import cv2
+        import pytesseract
+        import numpy as np
+    except ImportError:
+        logging.warning("未找到必要的库，无法从视频帧中提取文本。")
+        return ""
+    
+    # 转换为灰度图
+    gray = cv2.cvtColor(np.asarray(frame), cv2.COLOR_RGB2GRAY)
+    
+    # 应用自适应阈值处理，以提高OCR准确性
+    thresh = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY, 11, 2
+    )
+    
+    # OCR识别文本
+    text = pytesseract.image_to_string(thresh, lang='chi_sim+eng')
+    return text.strip() if text else ""
+
+def _audio_outcome(audio_result: Dict[str, Any]) -> tuple:
+    """把语音识别结果转换为(文本, 带时间戳的文本片段, 错误信息或None)"""
+    if not audio_result.get("success", False):
+        logging.warning(f"识别视频音频失败: {audio_result.get('error')}")
+        return "", [], audio_result.get("error") or "语音识别失败"
+    
+    audio_metadata = audio_result.get("metadata") or {}
+    error = None
+    if audio_metadata.get("partial"):
+        error = (f"{audio_metadata.get('failed_segments')}个语音片段识别失败: "
+                 f"{audio_metadata.get('segment_error')}")
+    return audio_result.get("text", ""), audio_result.get("segments", []), error
+
+def _transcribe_audio_stream(stream) -> tuple:
+    """对单次解码输出的音频管道进行语音识别，返回(文本, 带时间戳的文本片段, 错误信息或None)"""
+    try:
+        from .audio_processor import transcribe_pcm_stream
+        
+        return _audio_outcome(transcribe_pcm_stream(stream))
+    except ImportError:
+        logging.warning("未找到必要的库，无法识别视频中的语音。")
+        return "", [], None
+    except Exception as e:
+        logging.error(f"识别视频音频时出错: {str(e)}", exc_info=True)
+        return "", [], f"识别视频音频时出错: {str(e)}"
+    finally:
+        # 识别提前结束时读完剩余音频，避免ffmpeg因音频管道写满而阻塞帧输出
+        while stream.read(1024 * 1024):
+            pass
+        stream.close()
+
 def extract_video_metadata(file_path: str) -> Dict[str, Any]:
     """
     提取视频文件的元数据
@@ -114,6 +458,19 @@ def extract_video_metadata(file_path: str) -> Dict[str, Any]:
     
     return metadata
 
+def _transcribe_audio_file(file_path: str) -> tuple:
+    """单独解码视频音轨并识别，返回(文本, 带时间戳的文本片段, 错误信息或None)"""
+    try:
+        from .audio_processor import process_audio
+        
+        return _audio_outcome(process_audio(file_path))
+    except ImportError:
+        logging.warning("未找到必要的库，无法从视频中提取音频文本。")
+        return "", [], None
+    except Exception as e:
+        logging.error(f"从视频中提取音频时出错: {str(e)}", exc_info=True)
+        return "", [], f"从视频中提取音频时出错: {str(e)}"
+
 def extract_audio_from_video(file_path: str) -> str:
     """
     从视频中提取音频并进行语音识别
@@ -125,26 +482,11 @@ def extract_audio_from_video(file_path: str) -> str:
         识别的文本内容
     """
     try:
-        from moviepy.editor import VideoFileClip
-        import speech_recognition as sr
-        
-        # 创建临时文件用于保存提取的音频
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_path = temp_file.name
-            
-        # 加载视频并提取音频
-        with VideoFileClip(file_path) as video:
-            video.audio.write_audiofile(temp_path, logger=None)
-        
-        # 使用音频处理模块进行语音识别
+        # ffmpeg直接从视频容器解码音轨到内存，不再导出临时WAV文件
         from .audio_processor import process_audio
         
         # 处理音频
-        audio_result = process_audio(temp_path)
-        
-        # 清理临时文件
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        audio_result = process_audio(file_path)
         
         # 如果返回的是字典（增强版函数），提取文本
         if isinstance(audio_result, dict):
@@ -154,7 +496,7 @@ def extract_audio_from_video(file_path: str) -> str:
         
     except ImportError:
         logging.warning("未找到必要的库，无法从视频中提取音频文本。")
-        return "需要安装moviepy和SpeechRecognition库以从视频中提取音频。"
+        return "需要安装pydub和SpeechRecognition库以从视频中提取音频。"
     except Exception as e:
         logging.error(f"从视频中提取音频时出错: {str(e)}", exc_info=True)
         return f"从视频中提取音频时出错: {str(e)}"
@@ -173,9 +515,6 @@ def extract_frames_with_text(file_path: str, interval: int = 10) -> List[Dict[st
     frames = []
     
     try:
-        import cv2
-        import pytesseract
-        import numpy as np
         from moviepy.editor import VideoFileClip
         
         # 加载视频
@@ -183,33 +522,9 @@ def extract_frames_with_text(file_path: str, interval: int = 10) -> List[Dict[st
         duration = video.duration
         fps = video.fps
         
-        # 每隔interval秒提取一帧
-        for t in range(0, int(duration), interval):
-            # 获取帧
-            frame = video.get_frame(t)
-            
-            # 转换为OpenCV格式
-            frame_cv = cv2.cvtColor(np.array(frame), cv2.COLOR_RGB2BGR)
-            
-            # 转换为灰度图
-            gray = cv2.cvtColor(frame_cv, cv2.COLOR_BGR2GRAY)
-            
-            # 应用自适应阈值处理，以提高OCR准确性
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY, 11, 2
-            )
-            
-            # OCR识别文本
-            text = pytesseract.image_to_string(thresh, lang='chi_sim+eng')
-            
-            # 如果识别到文本，保存帧信息
-            if text and text.strip():
-                frames.append({
-                    "time": t,
-                    "text": text.strip(),
-                    "frame_number": int(t * fps)
-                })
+        # 每隔interval秒提取一帧，画面变化时才识别文本
+        sampled = ((t, video.get_frame(t)) for t in range(0, int(duration), interval))
+        frames, _ = collect_frame_text(sampled, fps)
         
         # 关闭视频
         video.close()
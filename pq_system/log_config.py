@@ -0,0 +1,33 @@
+import logging
+import threading
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+_configured_files = set()
+_lock = threading.Lock()
+
+
+def setup_file_logging(filename: str) -> None:
+    """
+    为根日志记录器添加写入指定文件的处理器（同一文件只添加一次）
+
+    各模块在第一次实际使用时调用，而不是在导入时配置日志，
+    避免仅导入模块就创建日志文件、抢先设置全局日志格式。
+
+    Args:
+        filename: 日志文件路径（相对路径基于当前工作目录）
+    """
+    if filename in _configured_files:
+        return
+
+    with _lock:
+        if filename in _configured_files:
+            return
+
+        # 尚未配置日志时保持原有行为：INFO级别并输出到控制台
+        logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+        handler = logging.FileHandler(filename)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logging.getLogger().addHandler(handler)
+        _configured_files.add(filename)
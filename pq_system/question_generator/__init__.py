@@ -1,22 +1,40 @@
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+from typing import Dict, Iterator, List, Any, Optional
 import os
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('question_generator.log'),
-        logging.StreamHandler()
-    ]
-)
-
 from .generator import QuestionGenerator
 from .quality_checker import QuestionQualityChecker
+from .chunking import SECTION_MAX_CHARS, split_into_sections
+from log_config import setup_file_logging
+
+# 按API密钥复用的生成器和检查器实例（实例无状态，可在线程间共享）
+_instances = {}
+_instances_lock = threading.Lock()
+
+def _get_instance(cls, api_key: str):
+    """获取指定类和API密钥对应的共享实例"""
+    key = (cls, api_key)
+    instance = _instances.get(key)
+    if instance is None:
+        with _instances_lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = _instances[key] = cls(api_key=api_key)
+    return instance
+
+def _get_api_key() -> Optional[str]:
+    """读取DEEPSEEK_API_KEY，环境变量中没有时从exam.env加载"""
+    api_key = os.environ.get('DEEPSEEK_API_KEY')
+    if not api_key:
+        # 尝试从config中获取
+        from dotenv import load_dotenv
+        load_dotenv('exam.env')
+        api_key = os.environ.get('DEEPSEEK_API_KEY')
+    return api_key
 
 def generate_questions(content_text: str, num_questions: int = 5, difficulty: str = 'medium',
-                       check_quality: bool = True) -> List[Dict[str, Any]]:
+                       check_quality: bool = True, chunked: Optional[bool] = None) -> List[Dict[str, Any]]:
     """
     基于内容文本生成选择题
     
@@ -25,43 +43,98 @@ def generate_questions(content_text: str, num_questions: int = 5, difficulty: st
         num_questions: 要生成的问题数量
         difficulty: 难度级别 ('easy', 'medium', 'hard')
         check_quality: 是否检查并改进问题质量
+        chunked: 是否分段生成以覆盖全文，None表示文本超过单次生成的长度上限时自动分段
         
     Returns:
         包含生成的问题的字典列表
     """
+    setup_file_logging('question_generator.log')
+    
     try:
         # 获取API密钥
-        api_key = os.environ.get('DEEPSEEK_API_KEY')
-        if not api_key:
-            # 尝试从config中获取
-            from dotenv import load_dotenv
-            load_dotenv('exam.env')
-            api_key = os.environ.get('DEEPSEEK_API_KEY')
-            
+        api_key = _get_api_key()
         if not api_key:
             logging.error("找不到DEEPSEEK_API_KEY环境变量")
             return []
             
-        # 创建问题生成器实例
-        generator = QuestionGenerator(api_key=api_key)
+        # 获取问题生成器实例
+        generator = _get_instance(QuestionGenerator, api_key)
+        
+        if chunked is None:
+            chunked = len(content_text) > SECTION_MAX_CHARS
         
         # 生成问题
-        questions = generator.generate_questions_with_retry(
-            text=content_text,
-            num_questions=num_questions,
-            difficulty=difficulty
-        )
+        if chunked:
+            questions = generator.generate_questions_chunked(
+                text=content_text,
+                num_questions=num_questions,
+                difficulty=difficulty
+            )
+        else:
+            questions = generator.generate_questions_with_retry(
+                text=content_text,
+                num_questions=num_questions,
+                difficulty=difficulty
+            )
         
         # 如果需要检查质量
         if check_quality and questions:
-            # 创建质量检查器实例
-            checker = QuestionQualityChecker(api_key=api_key)
+            # 获取质量检查器实例
+            checker = _get_instance(QuestionQualityChecker, api_key)
             
-            # 检查并改进问题
-            questions = checker.batch_check_questions(questions, content_text)
+            # 检查并改进问题；分段生成的问题对照其来源分段检查
+            if chunked:
+                sections = split_into_sections(content_text)
+                # 所有分段的问题在一次并发检查中完成，不按分段依次等待
+                pairs = [
+                    (q, sections[q['section']]) for q in questions
+                    if isinstance(q.get('section'), int) and 0 <= q['section'] < len(sections)
+                ]
+                questions = checker.batch_check_question_pairs(pairs)
+            else:
+                questions = checker.batch_check_questions(questions, content_text)
             
         return questions
         
     except Exception as e:
         logging.error(f"生成问题失败: {str(e)}", exc_info=True)
-        return [] 
\ No newline at end of file
+        return []
+
+def generate_questions_stream(content_text: str, num_questions: int = 5, difficulty: str = 'medium',
+                              check_quality: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    流式生成选择题：每个问题解析完成（并通过质量检查）后立即产出
+    
+    长文本分段同时生成，见QuestionGenerator.generate_questions_stream()。
+    
+    Args:
+        content_text: 内容文本
+        num_questions: 要生成的问题数量
+        difficulty: 难度级别 ('easy', 'medium', 'hard')
+        check_quality: 是否逐个检查并改进问题质量
+        
+    Yields:
+        问题字典
+        
+    Raises:
+        ValueError: 找不到API密钥或文本太短
+        RuntimeError: 无法生成问题
+    """
+    setup_file_logging('question_generator.log')
+    
+    api_key = _get_api_key()
+    if not api_key:
+        raise ValueError("找不到DEEPSEEK_API_KEY环境变量")
+    
+    generator = _get_instance(QuestionGenerator, api_key)
+    checker = _get_instance(QuestionQualityChecker, api_key) if check_quality else None
+    sections = split_into_sections(content_text) if checker is not None else []
+    
+    for question in generator.generate_questions_stream(content_text, num_questions, difficulty):
+        if checker is not None:
+            # 对照问题的来源分段检查
+            section = question.get('section', 0)
+            source_text = sections[section] if len(sections) > 1 and section < len(sections) else content_text
+            question = checker.check_questions([question], source_text)[0]
+        yield question
+
@@ -0,0 +1,173 @@
+import re
+import difflib
+from typing import Any, Dict, List
+
+# 每个分段的token预算和字符上限（与单次生成的文本长度上限一致）
+SECTION_MAX_TOKENS = 2000
+SECTION_MAX_CHARS = 6000
+
+# 问题和选项文本的相似度达到该值视为重复
+DUPLICATE_SIMILARITY = 0.95
+
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+_SENTENCE_END_RE = re.compile(r'(?<=[。！？；!?;.])\s*')
+_NORMALIZE_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计文本的token数：中日文字符按每字1个token，其余字符按每4个字符1个token
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _split_long_paragraph(paragraph: str, max_tokens: int, max_chars: int) -> List[str]:
+    """按句子切分超出预算的段落，单个句子仍超出时按字符数硬切"""
+    pieces = []
+    for sentence in _SENTENCE_END_RE.split(paragraph):
+        while len(sentence) > max_chars or estimate_tokens(sentence) > max_tokens:
+            cut = min(max_chars, max_tokens)
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def split_into_sections(text: str, max_tokens: int = SECTION_MAX_TOKENS,
+                        max_chars: int = SECTION_MAX_CHARS) -> List[str]:
+    """
+    按段落边界把长文本切分为不超过token预算的分段
+
+    相邻段落尽量合并到同一分段；单个段落超出预算时再按句子切分。
+
+    Args:
+        text: 完整文本
+        max_tokens: 每个分段的token预算
+        max_chars: 每个分段的字符上限
+
+    Returns:
+        按原文顺序排列的分段列表
+    """
+    sections = []
+    current = []
+    current_tokens = 0
+    current_chars = 0
+
+    def flush():
+        nonlocal current, current_tokens, current_chars
+        if current:
+            sections.append("\n\n".join(current))
+        current, current_tokens, current_chars = [], 0, 0
+
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+
+        pieces = [paragraph]
+        if len(paragraph) > max_chars or estimate_tokens(paragraph) > max_tokens:
+            pieces = _split_long_paragraph(paragraph, max_tokens, max_chars)
+
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and (current_tokens + tokens > max_tokens or current_chars + len(piece) + 2 > max_chars):
+                flush()
+            current.append(piece)
+            current_tokens += tokens
+            current_chars += len(piece) + 2
+    flush()
+
+    return sections
+
+
+def allocate_questions(sections: List[str], num_questions: int) -> List[int]:
+    """
+    按各分段的长度把问题数量分配到分段上（最大余数法）
+
+    问题数少于分段数时，在全文中均匀选取分段，每个分段一道题。
+
+    Returns:
+        与sections一一对应的问题数量列表，总和为num_questions
+    """
+    counts = [0] * len(sections)
+    if not sections or num_questions <= 0:
+        return counts
+
+    if num_questions < len(sections):
+        for k in range(num_questions):
+            counts[int((k + 0.5) * len(sections) / num_questions)] += 1
+        return counts
+
+    weights = [max(1, estimate_tokens(section)) for section in sections]
+    total = sum(weights)
+    shares = [num_questions * weight / total for weight in weights]
+    counts = [int(share) for share in shares]
+
+    remaining = num_questions - sum(counts)
+    for i in sorted(range(len(sections)), key=lambda i: shares[i] - counts[i], reverse=True)[:remaining]:
+        counts[i] += 1
+
+    return counts
+
+
+def _question_key(question: Dict[str, Any]) -> str:
+    """用于去重的问题文本：题干加选项，去掉空白和标点"""
+    options = question.get('options') or []
+    text = str(question.get('question') or '')
+    if text:
+        text += '|' + '|'.join(str(option) for option in options)
+    return _NORMALIZE_RE.sub('', text).lower()
+
+
+class QuestionDeduper:
+    """逐个判断问题是否与之前的问题重复（题干和选项完全相同或高度相似）"""
+
+    def __init__(self):
+        self._seen = []
+
+    def add(self, question: Dict[str, Any]) -> bool:
+        """记录问题，返回是否为新问题"""
+        key = _question_key(question)
+        if not key or any(
+            key == other or difflib.SequenceMatcher(None, key, other).ratio() >= DUPLICATE_SIMILARITY
+            for other in self._seen
+        ):
+            return False
+        self._seen.append(key)
+        return True
+
+
+def merge_questions(section_questions: List[List[Dict[str, Any]]], num_questions: int) -> List[Dict[str, Any]]:
+    """
+    合并各分段生成的问题并去重
+
+    题干和选项完全相同或高度相似的只保留一个；超出数量时按分段轮流选取，保持对全文的覆盖。
+
+    Args:
+        section_questions: 每个分段生成的问题列表（按分段顺序）
+        num_questions: 需要的问题数量
+
+    Returns:
+        合并后的问题列表
+    """
+    kept = []
+    deduper = QuestionDeduper()
+    per_section = [[question for question in questions if deduper.add(question)] for questions in section_questions]
+
+    # 按分段轮流选取
+    index = 0
+    while len(kept) < num_questions and any(index < len(questions) for questions in per_section):
+        for questions in per_section:
+            if index < len(questions) and len(kept) < num_questions:
+                kept.append(questions[index])
+        index += 1
+
+    # 恢复原文顺序
+    order = {id(question): position for position, question in
+             enumerate(question for questions in per_section for question in questions)}
+    kept.sort(key=lambda question: order[id(question)])
+    return kept
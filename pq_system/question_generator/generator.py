@@ -3,23 +3,29 @@ import logging
 import json
 import time
 import random
-from typing import List, Dict, Any, Optional
-import requests
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Any, Optional
 import sys
 
 # 添加当前项目路径到sys.path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
+from log_config import setup_file_logging
+from .http_client import (AsyncLLMClient, chat_completion, stream_chat_completion, run_async,
+                          default_max_concurrency)
+from .response_cache import discard_cached_response
+from .stream_parser import JSONArrayStreamParser
+from .chunking import (SECTION_MAX_CHARS, QuestionDeduper, split_into_sections, allocate_questions,
+                       merge_questions)
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('question_generator.log'),
-        logging.StreamHandler()
-    ]
-)
+# 生成失败后重试前的等待时间（秒）
+RETRY_DELAY = 2
+
+# 分段生成去重后数量不足时，补充生成的轮数
+TOP_UP_ROUNDS = 1
 
 class QuestionGenerator:
     """问题生成器：基于内容生成选择题"""
@@ -32,6 +38,8 @@ class QuestionGenerator:
             api_key: API密钥，如果为None则从配置中获取
             model: 使用的AI模型
         """
+        setup_file_logging('question_generator.log')
+        
         self.api_key = api_key or os.environ.get('DEEPSEEK_API_KEY') or config.get('DEEPSEEK_API_KEY')
         if not self.api_key:
             raise ValueError("未提供API密钥。请在配置中设置DEEPSEEK_API_KEY或直接提供api_key参数。")
@@ -51,34 +59,51 @@ class QuestionGenerator:
         Returns:
             包含生成的问题的字典列表
         """
-        if not text or len(text.strip()) < 50:
-            raise ValueError("文本内容太短，无法生成有意义的问题")
-        
-        # 限制文本长度以避免超出模型限制
-        max_text_length = 6000  # 安全限制
-        if len(text) > max_text_length:
-            logging.info(f"文本长度超过限制，截取前{max_text_length}个字符")
-            text = text[:max_text_length]
-        
         # 构建提示词
-        prompt = self._build_prompt(text, num_questions, difficulty)
+        prompt = self._build_prompt(self._prepare_text(text), num_questions, difficulty)
         
         try:
             # 调用AI API生成问题
             response = self._call_api(prompt)
             
-            # 解析响应
-            questions = self._parse_response(response)
-            
-            # 验证和清理问题
-            questions = self._validate_questions(questions)
-            
-            return questions
+            # 解析响应并验证和清理问题
+            return self._validate_questions(self._parse_response(response))
         
+        except ValueError:
+            discard_cached_response(self._request_payload(prompt))
+            raise
+        except Exception as e:
+            logging.error(f"生成问题时出错: {str(e)}", exc_info=True)
+            raise
+    
+    async def generate_questions_async(self, text: str, num_questions: int, difficulty: str,
+                                       client: AsyncLLMClient) -> List[Dict[str, Any]]:
+        """generate_questions()的异步版本，API调用受client的并发数和速率限制"""
+        prompt = self._build_prompt(self._prepare_text(text), num_questions, difficulty)
+        
+        try:
+            response = await client.chat_completion(self.api_base, self.api_key, self._request_payload(prompt))
+            return self._validate_questions(self._parse_response(response))
+        
+        except ValueError:
+            discard_cached_response(self._request_payload(prompt))
+            raise
         except Exception as e:
             logging.error(f"生成问题时出错: {str(e)}", exc_info=True)
             raise
     
+    def _prepare_text(self, text: str) -> str:
+        """检查文本长度，超出单次生成的上限时截断"""
+        if not text or len(text.strip()) < 50:
+            raise ValueError("文本内容太短，无法生成有意义的问题")
+        
+        # 限制文本长度以避免超出模型限制（长文本使用generate_questions_chunked）
+        max_text_length = SECTION_MAX_CHARS  # 安全限制
+        if len(text) > max_text_length:
+            logging.info(f"文本长度超过限制，截取前{max_text_length}个字符")
+            text = text[:max_text_length]
+        return text
+    
     def _build_prompt(self, text: str, num_questions: int, difficulty: str) -> str:
         """构建提示词"""
         difficulty_descriptions = {
@@ -122,37 +147,18 @@ class QuestionGenerator:
         
         return prompt
     
-    def _call_api(self, prompt: str) -> str:
-        """调用AI API"""
-        url = f"{self.api_base}/chat/completions"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        data = {
+    def _request_payload(self, prompt: str) -> Dict[str, Any]:
+        """构建API请求体"""
+        return {
             "model": "deepseek-chat",  # Use the correct model name for DeepSeek
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.7,
             "max_tokens": 2000  # Add max tokens limit
         }
-        
-        try:
-            response = requests.post(url, headers=headers, json=data, timeout=60)  # Add timeout
-            
-            # Log the response for debugging
-            if response.status_code != 200:
-                logging.error(f"API错误响应: {response.status_code} - {response.text}")
-            
-            response.raise_for_status()
-            
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        
-        except requests.RequestException as e:
-            logging.error(f"API调用失败: {str(e)}")
-            raise
+    
+    def _call_api(self, prompt: str) -> str:
+        """调用AI API（通过共享的连接池）"""
+        return chat_completion(self.api_base, self.api_key, self._request_payload(prompt))
     
     def _parse_response(self, response: str) -> List[Dict[str, Any]]:
         """解析API响应，提取JSON"""
@@ -208,6 +214,212 @@ class QuestionGenerator:
             except Exception as e:
                 logging.warning(f"生成问题失败 (尝试 {retries+1}/{max_retries}): {str(e)}")
                 retries += 1
-                time.sleep(2)  # 等待2秒后重试
+                time.sleep(RETRY_DELAY)
         
-        raise RuntimeError(f"在 {max_retries} 次尝试后仍无法生成问题") 
\ No newline at end of file
+        raise RuntimeError(f"在 {max_retries} 次尝试后仍无法生成问题") 
+    
+    async def generate_questions_with_retry_async(self, text: str, num_questions: int, difficulty: str,
+                                                  client: AsyncLLMClient, max_retries: int = 3) -> List[Dict[str, Any]]:
+        """generate_questions_with_retry()的异步版本，重试等待期间不占用线程"""
+        for attempt in range(max_retries):
+            try:
+                return await self.generate_questions_async(text, num_questions, difficulty, client)
+            except Exception as e:
+                logging.warning(f"生成问题失败 (尝试 {attempt+1}/{max_retries}): {str(e)}")
+                if attempt + 1 < max_retries:
+                    await asyncio.sleep(RETRY_DELAY)
+        
+        raise RuntimeError(f"在 {max_retries} 次尝试后仍无法生成问题")
+    
+    def generate_questions_chunked(self, text: str, num_questions: int = 5, difficulty: str = 'medium',
+                                   max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        基于全文分段生成问题（map-reduce）
+        
+        按token预算把文本切分为多个分段，按分段长度分配问题数量，
+        各分段并发调用API生成，最后合并去重（去重后数量不足时补充生成）。耗时接近单次调用，问题覆盖整篇文档。
+        每个问题的section字段为其来源分段的序号。
+        
+        Args:
+            text: 完整文本
+            num_questions: 要生成的问题数量
+            difficulty: 难度级别 ('easy', 'medium', 'hard')
+            max_workers: 同时进行的API调用数，None表示使用LLM_MAX_CONCURRENCY
+            
+        Returns:
+            包含生成的问题的字典列表；所有分段都失败时抛出RuntimeError
+        """
+        async def generate():
+            async with AsyncLLMClient(max_concurrency=max_workers) as client:
+                return await self.generate_questions_chunked_async(text, num_questions, difficulty, client)
+        
+        return run_async(generate())
+    
+    async def generate_questions_chunked_async(self, text: str, num_questions: int, difficulty: str,
+                                               client: AsyncLLMClient) -> List[Dict[str, Any]]:
+        """generate_questions_chunked()的异步版本，各分段的调用在client的限制下并发进行"""
+        sections = split_into_sections(text)
+        if len(sections) <= 1:
+            questions = await self.generate_questions_with_retry_async(text, num_questions, difficulty, client)
+            for question in questions:
+                question["section"] = 0
+            return questions
+        
+        counts = allocate_questions(sections, num_questions)
+        tasks = [(index, count) for index, count in enumerate(counts) if count > 0]
+        logging.info(f"文本切分为{len(sections)}个分段，在{len(tasks)}个分段上生成{num_questions}个问题")
+        
+        async def generate(index, count):
+            try:
+                questions = await self.generate_questions_with_retry_async(sections[index], count, difficulty, client)
+            except Exception as e:
+                logging.warning(f"第{index + 1}个分段生成问题失败: {str(e)}")
+                return None
+            for question in questions:
+                question["section"] = index
+            return questions
+        
+        results = await asyncio.gather(*(generate(index, count) for index, count in tasks))
+        
+        succeeded = [questions for questions in results if questions is not None]
+        if not succeeded:
+            raise RuntimeError("所有分段都无法生成问题")
+        
+        questions = merge_questions(succeeded, num_questions)
+        deduper = QuestionDeduper()
+        for question in questions:
+            deduper.add(question)
+        
+        # 去重或分段失败导致数量不足时，按缺少的数量重新分配到各分段补充生成
+        for _ in range(TOP_UP_ROUNDS):
+            shortfall = num_questions - len(questions)
+            if shortfall <= 0:
+                break
+            logging.info(f"分段生成去重后得到{len(questions)}个问题，补充生成{shortfall}个")
+            counts = allocate_questions(sections, shortfall)
+            extra = await asyncio.gather(*(generate(index, count) for index, count in enumerate(counts) if count > 0))
+            for batch in extra:
+                for question in batch or []:
+                    if len(questions) < num_questions and deduper.add(question):
+                        questions.append(question)
+        questions.sort(key=lambda question: question["section"])
+        
+        if len(questions) < num_questions:
+            logging.warning(f"分段生成去重后得到{len(questions)}个问题，少于请求的{num_questions}个")
+        return questions
+    
+    def stream_questions(self, text: str, num_questions: int = 5, difficulty: str = 'medium',
+                         stop: Optional[threading.Event] = None, max_retries: int = 3) -> Iterator[Dict[str, Any]]:
+        """
+        流式生成：边接收模型输出边解析，每个问题对象完整后立即产出
+        
+        尚未产出任何问题时失败会重试；已产出问题后失败直接抛出异常。
+        
+        Args:
+            text: 基于此文本生成问题（超出单次生成的上限时截断）
+            num_questions: 要生成的问题数量
+            difficulty: 难度级别 ('easy', 'medium', 'hard')
+            stop: 可选，设置后停止接收剩余的输出
+            max_retries: 最大尝试次数
+            
+        Yields:
+            验证通过的问题字典
+        """
+        prompt = self._build_prompt(self._prepare_text(text), num_questions, difficulty)
+        payload = self._request_payload(prompt)
+        
+        for attempt in range(max_retries):
+            parser = JSONArrayStreamParser()
+            produced = 0
+            chunks = stream_chat_completion(self.api_base, self.api_key, payload)
+            try:
+                for chunk in chunks:
+                    for question in self._validate_questions(parser.feed(chunk)):
+                        produced += 1
+                        yield question
+                    if stop is not None and stop.is_set():
+                        return
+                if produced:
+                    return
+                discard_cached_response(payload)
+                error = ValueError("流式响应中没有可用的问题")
+            except Exception as e:
+                if produced:
+                    raise
+                error = e
+            finally:
+                chunks.close()
+            
+            logging.warning(f"流式生成问题失败 (尝试 {attempt+1}/{max_retries}): {str(error)}")
+            if attempt + 1 < max_retries:
+                time.sleep(RETRY_DELAY)
+        
+        raise RuntimeError(f"在 {max_retries} 次尝试后仍无法生成问题")
+    
+    def generate_questions_stream(self, text: str, num_questions: int = 5,
+                                  difficulty: str = 'medium') -> Iterator[Dict[str, Any]]:
+        """
+        流式生成覆盖全文的问题
+        
+        长文本按generate_questions_chunked()的方式分段，各分段同时流式生成，
+        问题按到达顺序去重后立即产出，达到num_questions后停止其余分段；
+        全部结束后数量仍不足时，与generate_questions_chunked()一样补充生成一轮。
+        每个问题的section字段为其来源分段的序号。
+        
+        Yields:
+            问题字典；所有分段都失败时抛出RuntimeError
+        """
+        sections = split_into_sections(text) or [text]
+        deduper = QuestionDeduper()
+        produced = 0
+        results = queue.Queue()
+        stop = threading.Event()
+        
+        def worker(index, count):
+            try:
+                for question in self.stream_questions(sections[index], count, difficulty, stop):
+                    question["section"] = index
+                    results.put(('question', question))
+            except Exception as e:
+                logging.warning(f"第{index + 1}个分段生成问题失败: {str(e)}")
+                results.put(('error', e))
+            finally:
+                results.put(('done', None))
+        
+        executor = ThreadPoolExecutor(max_workers=min(default_max_concurrency(), len(sections)),
+                                      thread_name_prefix="pq-stream")
+        try:
+            # 第一轮按分段长度分配；去重或分段失败导致数量不足时，按缺少的数量补充生成
+            for round_number in range(1 + TOP_UP_ROUNDS):
+                shortfall = num_questions - produced
+                if shortfall <= 0:
+                    break
+                if round_number:
+                    logging.info(f"流式分段生成去重后得到{produced}个问题，补充生成{shortfall}个")
+                
+                tasks = [(index, count) for index, count in enumerate(allocate_questions(sections, shortfall))
+                         if count > 0]
+                for index, count in tasks:
+                    executor.submit(worker, index, count)
+                
+                remaining = len(tasks)
+                failed = 0
+                while remaining and produced < num_questions:
+                    kind, value = results.get()
+                    if kind == 'done':
+                        remaining -= 1
+                    elif kind == 'error':
+                        failed += 1
+                    elif deduper.add(value):
+                        yield value
+                        produced += 1
+                
+                if not produced and failed:
+                    raise RuntimeError("所有分段都无法生成问题")
+            
+            if produced < num_questions:
+                logging.warning(f"流式分段生成去重后得到{produced}个问题，少于请求的{num_questions}个")
+        finally:
+            # 已达到数量或调用方提前结束时，通知其余分段停止接收输出
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,349 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Dict, Iterator, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .response_cache import get_response_cache
+
+# 连接池设置，可通过环境变量配置
+DEFAULT_POOL_SIZE = 16  # LLM_POOL_SIZE：每个主机保持的连接数
+DEFAULT_CONNECT_TIMEOUT = 5.0  # LLM_CONNECT_TIMEOUT：建立连接的超时（秒）
+DEFAULT_READ_TIMEOUT = 60.0  # LLM_READ_TIMEOUT：等待响应的超时（秒）
+
+# 并发和速率设置，可通过环境变量配置
+DEFAULT_MAX_CONCURRENCY = 8  # LLM_MAX_CONCURRENCY：一次批量操作中同时进行的调用数
+DEFAULT_RATE_LIMIT = 0.0  # LLM_RATE_LIMIT：每秒最多发起的调用数（进程内所有调用共享），0表示不限制
+RATE_LIMIT_RETRIES = 3  # 收到429响应后的重试次数
+RATE_LIMIT_BACKOFF = 2.0  # 没有Retry-After时的首次退避时间（秒），之后每次加倍
+
+T = TypeVar('T')
+
+_session = None
+_rate_limiter = None
+_lock = threading.Lock()
+
+
+def default_timeout() -> Tuple[float, float]:
+    """(连接超时, 读取超时)"""
+    return (
+        float(os.environ.get('LLM_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)),
+        float(os.environ.get('LLM_READ_TIMEOUT', DEFAULT_READ_TIMEOUT))
+    )
+
+
+def get_session() -> requests.Session:
+    """
+    获取进程内共享的HTTP会话
+
+    会话使用keep-alive连接池，所有LLM调用复用已建立的TLS连接，
+    不再为每个问题重新建立连接。requests.Session可以在多个线程间共享。
+    """
+    global _session
+    if _session is not None:
+        return _session
+
+    with _lock:
+        if _session is None:
+            pool_size = int(os.environ.get('LLM_POOL_SIZE', 0)) or DEFAULT_POOL_SIZE
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+    return _session
+
+
+def default_max_concurrency() -> int:
+    """一次批量操作中同时进行的调用数（LLM_MAX_CONCURRENCY，默认8）"""
+    return int(os.environ.get('LLM_MAX_CONCURRENCY', 0)) or DEFAULT_MAX_CONCURRENCY
+
+
+class RateLimiter:
+    """
+    按固定间隔发放调用名额的限速器，线程安全，可同时用于同步和异步调用
+
+    每次调用预约下一个可用时间点，调用方等待到该时间点再发起请求；
+    收到429时通过pause()让之后的所有调用一起推迟。
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+            return start - now
+
+    async def acquire(self) -> None:
+        """等待下一个调用名额（异步）"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self) -> None:
+        """等待下一个调用名额（阻塞当前线程）"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """在接下来的seconds秒内不再发放名额"""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取进程内共享的限速器（LLM_RATE_LIMIT）"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(float(os.environ.get('LLM_RATE_LIMIT', DEFAULT_RATE_LIMIT)))
+    return _rate_limiter
+
+
+def _reset_after_fork() -> None:
+    # 子进程不能复用父进程的连接
+    global _session, _rate_limiter, _lock
+    _session = None
+    _rate_limiter = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def post_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+              timeout: Optional[Tuple[float, float]] = None) -> Dict[str, Any]:
+    """
+    通过共享连接池发送JSON POST请求
+
+    Args:
+        url: 请求地址
+        payload: 请求体
+        headers: 请求头
+        timeout: (连接超时, 读取超时)，None表示使用默认值
+
+    Returns:
+        解析后的JSON响应
+
+    Raises:
+        requests.RequestException: 连接失败、超时或返回错误状态码
+    """
+    response = get_session().post(url, headers=headers, json=payload, timeout=timeout or default_timeout())
+
+    if response.status_code != 200:
+        logging.error(f"API错误响应: {response.status_code} - {response.text}")
+    response.raise_for_status()
+
+    return response.json()
+
+
+def _chat_completion(api_base: str, api_key: str, payload: Dict[str, Any],
+                     timeout: Optional[Tuple[float, float]] = None) -> str:
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    try:
+        result = post_json(f"{api_base}/chat/completions", payload, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        logging.error(f"API调用失败: {str(e)}")
+        raise
+    return result["choices"][0]["message"]["content"]
+
+
+def chat_completion(api_base: str, api_key: str, payload: Dict[str, Any],
+                    timeout: Optional[Tuple[float, float]] = None) -> str:
+    """
+    调用兼容OpenAI格式的chat/completions接口，返回第一条回复的文本
+
+    Args:
+        api_base: API基础地址
+        api_key: API密钥
+        payload: 请求体（model、messages等）
+        timeout: (连接超时, 读取超时)，None表示使用默认值
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        cached = cache.get(payload)
+        if cached is not None:
+            return cached
+
+    get_rate_limiter().acquire_blocking()
+    response = _chat_completion(api_base, api_key, payload, timeout)
+    if cache is not None:
+        cache.set(payload, response)
+    return response
+
+
+def stream_chat_completion(api_base: str, api_key: str, payload: Dict[str, Any],
+                           timeout: Optional[Tuple[float, float]] = None) -> Iterator[str]:
+    """
+    以流式方式调用chat/completions接口，逐段产出回复文本
+
+    请求带stream=True，按SSE格式读取增量（data: {...}，以data: [DONE]结束）。
+    完整回复在结束后写入响应缓存；缓存命中时一次产出整个回复。
+    提前关闭生成器会关闭连接，不再读取剩余的回复。
+
+    Args:
+        api_base: API基础地址
+        api_key: API密钥
+        payload: 请求体（model、messages等，无需包含stream）
+        timeout: (连接超时, 读取超时)，读取超时为两段数据之间的最长等待时间
+
+    Yields:
+        回复文本的增量
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        cached = cache.get(payload)
+        if cached is not None:
+            yield cached
+            return
+
+    get_rate_limiter().acquire_blocking()
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+        "Authorization": f"Bearer {api_key}"
+    }
+    try:
+        response = get_session().post(
+            f"{api_base}/chat/completions",
+            headers=headers,
+            json=dict(payload, stream=True),
+            timeout=timeout or default_timeout(),
+            stream=True
+        )
+    except requests.RequestException as e:
+        logging.error(f"API调用失败: {str(e)}")
+        raise
+
+    parts = []
+    completed = False
+    with response:
+        if response.status_code != 200:
+            logging.error(f"API错误响应: {response.status_code} - {response.text}")
+        response.raise_for_status()
+
+        for line in response.iter_lines(decode_unicode=False):
+            if not line.startswith(b'data:'):
+                continue
+            data = line[5:].strip()
+            if data == b'[DONE]':
+                completed = True
+                break
+            try:
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+            except (ValueError, KeyError, IndexError) as e:
+                logging.warning(f"跳过无法解析的流式数据: {str(e)}")
+                continue
+            if delta:
+                parts.append(delta)
+                yield delta
+
+    if cache is not None and completed:
+        cache.set(payload, ''.join(parts))
+
+
+def _retry_after(response: requests.Response, attempt: int) -> float:
+    try:
+        return max(0.0, float(response.headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return RATE_LIMIT_BACKOFF * (2 ** attempt)
+
+
+class AsyncLLMClient:
+    """
+    asyncio调用路径：在一次批量操作中并发发起多个调用
+
+    并发数由信号量限制，发起频率由进程内共享的限速器控制；收到429时按Retry-After
+    推迟所有调用后重试。请求本身通过共享连接池在客户端自己的线程池中执行
+    （不受事件循环默认线程池大小的限制）。每次asyncio.run()使用一个新的实例:
+
+        async with AsyncLLMClient() as client:
+            await client.chat_completion(...)
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, rate_limiter: Optional[RateLimiter] = None):
+        self.max_concurrency = max(1, max_concurrency or default_max_concurrency())
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self._semaphore = None
+        self._executor = None
+
+    async def __aenter__(self) -> 'AsyncLLMClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """关闭执行请求的线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def chat_completion(self, api_base: str, api_key: str, payload: Dict[str, Any],
+                              timeout: Optional[Tuple[float, float]] = None) -> str:
+        """异步版本的chat_completion()"""
+        # 缓存命中时不占用并发和速率名额
+        cache = get_response_cache()
+        if cache is not None:
+            cached = cache.get(payload)
+            if cached is not None:
+                return cached
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="pq-llm")
+        loop = asyncio.get_running_loop()
+
+        async with self._semaphore:
+            attempt = 0
+            while True:
+                await self.rate_limiter.acquire()
+                try:
+                    response = await loop.run_in_executor(
+                        self._executor, _chat_completion, api_base, api_key, payload, timeout
+                    )
+                except requests.HTTPError as e:
+                    response = e.response
+                    if response is None or response.status_code != 429 or attempt >= RATE_LIMIT_RETRIES:
+                        raise
+                    delay = _retry_after(response, attempt)
+                    logging.warning(f"API调用被限流，{delay:.1f}秒后重试 ({attempt + 1}/{RATE_LIMIT_RETRIES})")
+                    self.rate_limiter.pause(delay)
+                    attempt += 1
+                    continue
+
+                if cache is not None:
+                    cache.set(payload, response)
+                return response
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """
+    在同步代码中运行协程并返回结果
+
+    当前线程已有运行中的事件循环时，在单独的线程中运行。
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
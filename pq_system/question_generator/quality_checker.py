@@ -1,24 +1,16 @@
 import re
+import asyncio
 import logging
-from typing import Dict, List, Any, Tuple
-import requests
-import time
+from typing import Dict, List, Any, Optional, Tuple
 import os
 import sys
 
 # 添加当前项目路径到sys.path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('quality_checker.log'),
-        logging.StreamHandler()
-    ]
-)
+from log_config import setup_file_logging
+from .http_client import AsyncLLMClient, chat_completion, run_async
+from .response_cache import discard_cached_response
 
 class QuestionQualityChecker:
     """问题质量检查器：验证和改进生成的题目"""
@@ -31,6 +23,8 @@ class QuestionQualityChecker:
             api_key: API密钥，如果为None则从配置中获取
             model: 使用的AI模型
         """
+        setup_file_logging('quality_checker.log')
+        
         self.api_key = api_key or os.environ.get('DEEPSEEK_API_KEY') or config.get('DEEPSEEK_API_KEY')
         if not self.api_key:
             raise ValueError("未提供API密钥。请在配置中设置DEEPSEEK_API_KEY或直接提供api_key参数。")
@@ -42,6 +36,8 @@ class QuestionQualityChecker:
         """
         检查题目质量并改进
         
+        质量不达标的问题并发调用API改进，见check_questions_async()。
+        
         Args:
             questions: 待检查的问题列表
             original_text: 原始文本
@@ -52,29 +48,46 @@ class QuestionQualityChecker:
         if not questions:
             return []
         
-        improved_questions = []
+        return run_async(self.check_questions_async(questions, original_text))
+    
+    async def check_questions_async(self, questions: List[Dict[str, Any]], original_text: str,
+                                    client: Optional[AsyncLLMClient] = None) -> List[Dict[str, Any]]:
+        """
+        检查题目质量并并发改进（asyncio）
         
-        for question in questions:
-            # 对每个问题进行质量检查
-            quality_score, issues = self._assess_question_quality(question, original_text)
+        Args:
+            questions: 待检查的问题列表
+            original_text: 原始文本
+            client: 异步调用客户端，None表示新建（并发数和速率使用默认配置）
             
-            # 如果质量不达标，尝试改进
-            if quality_score < 0.7 and issues:
-                improved_question = self._improve_question(question, original_text, issues)
-                if improved_question:
-                    # 添加质量分数
-                    improved_question["quality_score"] = quality_score
-                    improved_questions.append(improved_question)
-                else:
-                    # 如果无法改进，保留原问题，但标记质量分数
-                    question["quality_score"] = quality_score
-                    improved_questions.append(question)
-            else:
-                # 质量足够好，保留原问题，添加质量分数
-                question["quality_score"] = quality_score
-                improved_questions.append(question)
+        Returns:
+            改进后的问题列表，顺序与输入一致
+        """
+        if client is None:
+            async with AsyncLLMClient() as client:
+                return await self.check_questions_async(questions, original_text, client)
         
-        return improved_questions
+        return list(await asyncio.gather(
+            *(self._check_question_async(question, original_text, client) for question in questions)
+        ))
+    
+    async def _check_question_async(self, question: Dict[str, Any], original_text: str,
+                                    client: AsyncLLMClient) -> Dict[str, Any]:
+        """检查单个问题，质量不达标时尝试改进"""
+        # 对每个问题进行质量检查
+        quality_score, issues = self._assess_question_quality(question, original_text)
+        
+        # 如果质量不达标，尝试改进
+        if quality_score < 0.7 and issues:
+            improved_question = await self._improve_question_async(question, original_text, issues, client)
+            if improved_question:
+                # 添加质量分数
+                improved_question["quality_score"] = quality_score
+                return improved_question
+        
+        # 质量足够好或无法改进时保留原问题，添加质量分数
+        question["quality_score"] = quality_score
+        return question
     
     def _assess_question_quality(self, question: Dict[str, Any], original_text: str) -> Tuple[float, List[str]]:
         """
@@ -166,12 +179,21 @@ class QuestionQualityChecker:
         Returns:
             改进后的问题或None（如果无法改进）
         """
+        async def improve():
+            async with AsyncLLMClient(max_concurrency=1) as client:
+                return await self._improve_question_async(question, original_text, issues, client)
+        
+        return run_async(improve())
+    
+    async def _improve_question_async(self, question: Dict[str, Any], original_text: str, issues: List[str],
+                                      client: AsyncLLMClient) -> Optional[Dict[str, Any]]:
+        """_improve_question()的异步版本"""
         # 构建提示词
         prompt = self._build_improvement_prompt(question, original_text, issues)
         
         try:
             # 调用API
-            response = self._call_api(prompt)
+            response = await client.chat_completion(self.api_base, self.api_key, self._request_payload(prompt))
             
             # 解析改进后的问题
             improved_question = self._parse_improved_question(response)
@@ -180,6 +202,7 @@ class QuestionQualityChecker:
                 return improved_question
             else:
                 logging.warning("无法解析改进后的问题，返回原问题")
+                discard_cached_response(self._request_payload(prompt))
                 return question
                 
         except Exception as e:
@@ -232,31 +255,17 @@ D. {question.get('options', ['', '', '', ''])[3] if len(question.get('options',
         
         return prompt
     
-    def _call_api(self, prompt: str) -> str:
-        """调用AI API"""
-        url = f"{self.api_base}/chat/completions"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        data = {
+    def _request_payload(self, prompt: str) -> Dict[str, Any]:
+        """构建API请求体"""
+        return {
             "model": self.model,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.5
         }
-        
-        try:
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        
-        except requests.RequestException as e:
-            logging.error(f"API调用失败: {str(e)}")
-            raise
+    
+    def _call_api(self, prompt: str) -> str:
+        """调用AI API（通过共享的连接池）"""
+        return chat_completion(self.api_base, self.api_key, self._request_payload(prompt))
     
     def _parse_improved_question(self, response: str) -> Dict[str, Any]:
         """解析改进后的问题"""
@@ -287,31 +296,45 @@ D. {question.get('options', ['', '', '', ''])[3] if len(question.get('options',
             return None
     
     def batch_check_questions(self, questions: List[Dict[str, Any]], original_text: str, 
-                            batch_size: int = 5, delay: float = 1.0) -> List[Dict[str, Any]]:
+                            batch_size: Optional[int] = None, delay: Optional[float] = None) -> List[Dict[str, Any]]:
         """
         批量检查和改进问题
         
+        所有需要改进的问题在一个事件循环中并发处理，并发数和调用频率由
+        LLM_MAX_CONCURRENCY和LLM_RATE_LIMIT控制，不再在批次之间固定等待。
+        
         Args:
             questions: 待检查的问题列表
             original_text: 原始文本
-            batch_size: 每批处理的问题数量
-            delay: 批次间延迟（秒）
+            batch_size: 同时进行的API调用数，None表示使用LLM_MAX_CONCURRENCY
+            delay: 已不再使用，保留以兼容旧的调用方式
             
         Returns:
             改进后的问题列表
         """
-        improved_questions = []
+        return self.batch_check_question_pairs([(question, original_text) for question in questions], batch_size)
+    
+    def batch_check_question_pairs(self, pairs: List[Tuple[Dict[str, Any], str]],
+                                   batch_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        批量检查和改进问题，每个问题对照各自的原文（如分段生成时的来源分段）
         
-        # 按批次处理
-        for i in range(0, len(questions), batch_size):
-            batch = questions[i:i+batch_size]
-            
-            # 检查并改进这一批问题
-            improved_batch = self.check_questions(batch, original_text)
-            improved_questions.extend(improved_batch)
+        所有问题在同一个事件循环中并发处理，不按原文分组依次等待。
+        
+        Args:
+            pairs: (问题, 原文)列表
+            batch_size: 同时进行的API调用数，None表示使用LLM_MAX_CONCURRENCY
             
-            # 添加延迟，避免API请求过于频繁
-            if i + batch_size < len(questions):
-                time.sleep(delay)
+        Returns:
+            改进后的问题列表，顺序与输入一致
+        """
+        if not pairs:
+            return []
+        
+        async def check():
+            async with AsyncLLMClient(max_concurrency=batch_size) as client:
+                return list(await asyncio.gather(
+                    *(self._check_question_async(question, text, client) for question, text in pairs)
+                ))
         
-        return improved_questions 
\ No newline at end of file
+        return run_async(check())
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+# 默认缓存文件，与Web应用的instance目录放在一起
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'llm_response_cache.sqlite3'
+)
+
+# 参与缓存键计算的请求参数（除messages外）
+KEY_PARAMETERS = ('model', 'temperature', 'max_tokens', 'top_p')
+
+
+class ReplayMissError(RuntimeError):
+    """回放模式下请求不在缓存中（回放模式不访问网络）"""
+
+
+def normalize_prompt(text: str) -> str:
+    """统一换行符并去掉行尾和首尾空白，格式上的差异不影响缓存命中"""
+    lines = str(text).replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def response_cache_key(payload: Dict[str, Any]) -> str:
+    """由模型、采样参数和规范化后的提示词生成缓存键"""
+    key = {name: payload.get(name) for name in KEY_PARAMETERS}
+    key['messages'] = [
+        {'role': message.get('role'), 'content': normalize_prompt(message.get('content', ''))}
+        for message in payload.get('messages') or []
+    ]
+    raw = json.dumps(key, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    基于SQLite的LLM响应缓存
+
+    按请求的模型、采样参数和提示词缓存回复文本；条目超过TTL后失效，
+    条目数超过上限时按最近访问时间淘汰（LRU）。多个线程和进程可共享同一个缓存文件。
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 0, max_entries: int = 10000, replay: bool = False):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_response ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_response_accessed_at ON llm_response (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        读取请求对应的缓存回复
+
+        Returns:
+            缓存的回复文本，不存在或已过期时返回None
+
+        Raises:
+            ReplayMissError: 回放模式下缓存中没有该请求
+        """
+        key = response_cache_key(payload)
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created_at FROM llm_response WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_response WHERE key = ?", (key,))
+                self._count('expired')
+                row = None
+            if row is not None:
+                conn.execute("UPDATE llm_response SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logging.warning(f"读取LLM响应缓存失败: {str(e)}")
+            row = None
+
+        if row is None:
+            self._count('misses')
+            if self.replay:
+                raise ReplayMissError(f"回放模式下LLM响应缓存未命中: {key}")
+            return None
+
+        self._count('hits')
+        return row[0]
+
+    def set(self, payload: Dict[str, Any], response: str) -> None:
+        """写入回复，并在条目数超出上限时淘汰最久未使用的条目"""
+        key = response_cache_key(payload)
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_response (key, model, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload.get('model'), response, now, now)
+            )
+            if self.max_entries:
+                excess = conn.execute("SELECT COUNT(*) FROM llm_response").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    conn.execute(
+                        "DELETE FROM llm_response WHERE key IN "
+                        "(SELECT key FROM llm_response ORDER BY accessed_at LIMIT ?)",
+                        (excess,)
+                    )
+                    with self._lock:
+                        self.evictions += excess
+        except sqlite3.Error as e:
+            logging.warning(f"写入LLM响应缓存失败: {str(e)}")
+
+    def delete(self, payload: Dict[str, Any]) -> None:
+        """删除请求对应的缓存条目（如回复无法解析时）"""
+        try:
+            self._connect().execute("DELETE FROM llm_response WHERE key = ?", (response_cache_key(payload),))
+        except sqlite3.Error as e:
+            logging.warning(f"删除LLM响应缓存失败: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中统计"""
+        try:
+            entries = self._connect().execute("SELECT COUNT(*) FROM llm_response").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "replay": self.replay,
+                "path": self.path
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    获取进程内共享的LLM响应缓存（默认关闭）
+
+    通过环境变量配置：
+        LLM_RESPONSE_CACHE_ENABLED: 设为1开启缓存
+        LLM_RESPONSE_CACHE_PATH: SQLite缓存文件路径
+        LLM_RESPONSE_CACHE_TTL_HOURS: 条目有效期（小时），0表示不过期，默认168
+        LLM_RESPONSE_CACHE_MAX_ENTRIES: 条目数上限，默认10000
+        LLM_RESPONSE_CACHE_REPLAY: 设为1时只从缓存回放，未命中时报错而不访问网络（用于基准测试）
+    """
+    global _cache
+    replay = os.environ.get('LLM_RESPONSE_CACHE_REPLAY', '0') == '1'
+    if os.environ.get('LLM_RESPONSE_CACHE_ENABLED', '0') != '1' and not replay:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                os.environ.get('LLM_RESPONSE_CACHE_PATH', DEFAULT_CACHE_PATH),
+                ttl_seconds=float(os.environ.get('LLM_RESPONSE_CACHE_TTL_HOURS', 168)) * 3600,
+                max_entries=int(os.environ.get('LLM_RESPONSE_CACHE_MAX_ENTRIES', 10000)),
+                replay=replay
+            )
+        return _cache
+
+
+def discard_cached_response(payload: Dict[str, Any]) -> None:
+    """回复不可用时从缓存中删除，避免重试时再次命中同一个回复"""
+    cache = get_response_cache()
+    if cache is not None and not cache.replay:
+        cache.delete(payload)
+
+
+def _reset_after_fork() -> None:
+    # 子进程重新打开数据库连接
+    global _cache, _cache_lock
+    _cache = None
+    _cache_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
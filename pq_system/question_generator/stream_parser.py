@@ -0,0 +1,99 @@
+import json
+import logging
+from typing import Any, Dict, List
+
+
+class JSONArrayStreamParser:
+    """
+    增量解析流式输出中的JSON数组
+
+    逐段喂入模型输出的文本，每当数组中的一个顶层对象完整闭合就立即解析并返回，
+    不必等待整个回复结束。数组前后的说明文字和```json代码块标记会被忽略，
+    对象中字符串以外的//注释会被去掉（提示词示例中带有注释）。
+    """
+
+    def __init__(self):
+        self._started = False  # 是否已进入顶层数组
+        self._depth = 0  # 当前对象的嵌套深度，0表示不在对象中
+        self._buffer = []
+        self._in_string = False
+        self._escape = False
+        self._slash = False
+        self._in_comment = False
+        self.finished = False  # 顶层数组已结束
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        喂入一段文本
+
+        Returns:
+            本段文本中完成的对象列表（无法解析的对象会被跳过）
+        """
+        objects = []
+        for char in chunk:
+            if self.finished:
+                break
+
+            if self._in_comment:
+                if char == '\n':
+                    self._in_comment = False
+                    self._buffer.append(char)
+                continue
+
+            if not self._started:
+                if char == '[':
+                    self._started = True
+                continue
+
+            if self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+                    self._buffer = [char]
+                elif char == ']':
+                    self.finished = True
+                continue
+
+            if self._in_string:
+                self._buffer.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if self._slash:
+                self._slash = False
+                if char == '/':
+                    self._in_comment = True
+                    continue
+                self._buffer.append('/')
+
+            if char == '/':
+                self._slash = True
+                continue
+
+            self._buffer.append(char)
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    obj = self._parse(''.join(self._buffer))
+                    if obj is not None:
+                        objects.append(obj)
+                    self._buffer = []
+
+        return objects
+
+    @staticmethod
+    def _parse(text: str):
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError as e:
+            logging.warning(f"跳过无法解析的流式对象: {str(e)}")
+            return None
+        return obj if isinstance(obj, dict) else None
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from input_processor.audio_processor import FINGERPRINT_SILENCE_AMPLITUDE, segment_fingerprint
+
+
+def _tone(amplitude, frequency=440, seconds=0.5, rate=16000):
+    t = np.arange(int(seconds * rate)) / rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype('<i2').tobytes()
+
+
+def test_quiet_segments_do_not_collide():
+    # Both tones stay below the trimming threshold
+    assert 400 < FINGERPRINT_SILENCE_AMPLITUDE
+    first = segment_fingerprint(_tone(300))
+    second = segment_fingerprint(_tone(400))
+    assert first != second
+    assert first != segment_fingerprint(b'')
+
+
+def test_padding_does_not_change_fingerprint():
+    speech = _tone(8000)
+    padding = b'\x00\x00' * 1600
+    assert segment_fingerprint(speech) == segment_fingerprint(padding + speech + padding)
@@ -0,0 +1,191 @@
+"""
+内容处理工作进程
+
+预先导入处理器依赖的重量级库，然后fork出多个常驻子进程领取并执行processing_job表中的任务。
+子进程处理WORKER_MAX_JOBS个任务或内存超过WORKER_MAX_RSS_MB后退出，由主进程重新fork补上。
+
+使用方式（Web进程设置PROCESSING_WORKERS=0，不再在请求进程中处理任务）:
+    python worker.py --processes 4
+"""
+import os
+import sys
+import time
+import socket
+import signal
+import logging
+import argparse
+
+# 添加当前目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.tasks import run_next_job, recover_stale_jobs
+from database import db
+
+_stopping = False
+
+
+def _request_stop(signum, frame):
+    global _stopping
+    _stopping = True
+
+
+def current_rss_mb() -> float:
+    """当前进程的常驻内存（MB）"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux以KB为单位，macOS以字节为单位
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def worker_loop(app, worker_name: str, max_jobs: int, max_rss_mb: int) -> int:
+    """
+    子进程主循环：持续领取任务，达到任务数或内存上限后返回
+
+    Returns:
+        本进程处理的任务数
+    """
+    poll_interval = float(app.config.get('PROCESSING_POLL_INTERVAL', 5))
+    processed = 0
+
+    while not _stopping:
+        with app.app_context():
+            try:
+                found = run_next_job(worker_name)
+            except Exception as e:
+                logging.error(f"工作进程处理任务出错: {str(e)}", exc_info=True)
+                db.session.rollback()
+                found = False
+            finally:
+                db.session.remove()
+
+        if not found:
+            time.sleep(poll_interval)
+            continue
+
+        processed += 1
+        if max_jobs and processed >= max_jobs:
+            logging.info(f"{worker_name} 已处理 {processed} 个任务，退出以便重启")
+            break
+        rss = current_rss_mb()
+        if max_rss_mb and rss > max_rss_mb:
+            logging.info(f"{worker_name} 内存 {rss:.0f}MB 超过上限 {max_rss_mb}MB，退出以便重启")
+            break
+
+    return processed
+
+
+def _spawn(app, slot: int, max_jobs: int, max_rss_mb: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # 子进程：忽略终端的SIGINT，收到主进程转发的SIGTERM后在当前任务完成时退出；
+    # 不复用父进程的数据库连接
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _request_stop)
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    worker_name = f"{socket.gethostname()}:{os.getpid()}:worker-{slot}"
+    code = 0
+    try:
+        worker_loop(app, worker_name, max_jobs, max_rss_mb)
+    except BaseException:
+        logging.error(f"{worker_name} 异常退出", exc_info=True)
+        code = 1
+    finally:
+        from input_processor.pdf_processor import shutdown_pdf_pool
+        shutdown_pdf_pool(wait=True)
+        logging.shutdown()
+        os._exit(code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PQ System 内容处理工作进程')
+    parser.add_argument('--config', default=os.getenv('FLASK_CONFIG', 'default'), help='配置名称')
+    parser.add_argument('--processes', type=int, default=None, help='子进程数（默认WORKER_PROCESSES）')
+    parser.add_argument('--max-jobs', type=int, default=None, help='子进程处理多少个任务后重启（默认WORKER_MAX_JOBS）')
+    parser.add_argument('--max-rss-mb', type=int, default=None, help='子进程内存上限MB（默认WORKER_MAX_RSS_MB）')
+    parser.add_argument('--no-preload', action='store_true', help='不预加载处理器依赖')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(process)d %(message)s'
+    )
+
+    app = create_app(args.config)
+    processes = args.processes if args.processes is not None else app.config['WORKER_PROCESSES']
+    max_jobs = args.max_jobs if args.max_jobs is not None else app.config['WORKER_MAX_JOBS']
+    max_rss_mb = args.max_rss_mb if args.max_rss_mb is not None else app.config['WORKER_MAX_RSS_MB']
+
+    # 每个子进程有自己的PDF进程池，未配置时按子进程数平分CPU核数，合计不超过核数
+    os.environ.setdefault('PDF_EXTRACT_WORKERS', str(max(1, (os.cpu_count() or 1) // max(1, processes))))
+
+    if not args.no_preload:
+        from input_processor import preload
+        preload()
+
+    with app.app_context():
+        recover_stale_jobs(int(app.config.get('PROCESSING_JOB_STALE_SECONDS', 6 * 3600)))
+        db.session.remove()
+        # fork前关闭连接池，子进程各自建立连接
+        db.engine.dispose()
+
+    if not hasattr(os, 'fork'):
+        # 不支持fork的平台（Windows）在当前进程中处理任务
+        signal.signal(signal.SIGINT, _request_stop)
+        signal.signal(signal.SIGTERM, _request_stop)
+        worker_name = f"{socket.gethostname()}:{os.getpid()}:worker"
+        while not _stopping:
+            worker_loop(app, worker_name, max_jobs, max_rss_mb)
+        return
+
+    children = {}
+
+    def stop_children(signum, frame):
+        _request_stop(signum, frame)
+        # 通知子进程在当前任务完成后退出
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop_children)
+    signal.signal(signal.SIGTERM, stop_children)
+
+    for slot in range(max(1, processes)):
+        children[_spawn(app, slot, max_jobs, max_rss_mb)] = slot
+    logging.info(f"已启动 {len(children)} 个内容处理工作进程")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        slot = children.pop(pid, None)
+        if slot is None:
+            continue
+        if _stopping:
+            continue
+
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) != 0:
+            # 避免子进程启动即崩溃时频繁重启
+            time.sleep(1)
+        children[_spawn(app, slot, max_jobs, max_rss_mb)] = slot
+
+    logging.info("内容处理工作进程已全部退出")
+
+
+if __name__ == '__main__':
+    main()